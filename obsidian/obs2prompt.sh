@@ -4,6 +4,8 @@
 export O2P_SCRIPT_PATH="/Users/user/____Sandruk/___PARA/__Areas/_5_CAREER/DEVOPS/automations/obsidian/obs2prompt_obsidian_to_prompt.py"
 export OBSIDIAN_VAULT_PATH="/Users/user/____Sandruk/___PKM"
 export O2P_OUTPUT_DIR="/Users/user/____Sandruk/___PKM/temp"
+# Thin client for the warm daemon (o2p-serve); falls back to the script when no daemon runs
+export O2P_CLIENT_PATH="${O2P_SCRIPT_PATH%/*}/obs2prompt_client.py"
 
 # Create output directory if it doesn't exist
 [ ! -d "$O2P_OUTPUT_DIR" ] && mkdir -p "$O2P_OUTPUT_DIR"
@@ -27,15 +29,18 @@ function o2p {
         return 1
     fi
 
-    # Execute python script
+    # Execute through the daemon client when available, else the python script
+    local runner="$O2P_SCRIPT_PATH"
+    [ -f "$O2P_CLIENT_PATH" ] && runner="$O2P_CLIENT_PATH"
+
     if [ -n "$debug_flag" ]; then
-        python3 "$O2P_SCRIPT_PATH" "$start_file" \
+        python3 "$runner" "$start_file" \
             --vault "$OBSIDIAN_VAULT_PATH" \
             --depth "$depth" \
             --output "$O2P_OUTPUT_DIR/aggregate_${start_file%.md}.txt" \
             --debug
     else
-        python3 "$O2P_SCRIPT_PATH" "$start_file" \
+        python3 "$runner" "$start_file" \
             --vault "$OBSIDIAN_VAULT_PATH" \
             --depth "$depth" \
             --output "$O2P_OUTPUT_DIR/aggregate_${start_file%.md}.txt"
@@ -48,6 +53,36 @@ function o2p2 { o2p "$1" 2; }
 function o2p3 { o2p "$1" 3; }
 function o2pd { o2p "$1" 1 "debug"; }
 
+# Aggregate every start note listed in a file (one per line) into $O2P_OUTPUT_DIR/batch
+function o2p-batch {
+    local roots_file="$1"
+    local depth="${2:-1}"
+
+    if [ -z "$roots_file" ]; then
+        echo "Usage: o2p-batch <roots file> [depth]"
+        return 1
+    fi
+
+    local runner="$O2P_SCRIPT_PATH"
+    [ -f "$O2P_CLIENT_PATH" ] && runner="$O2P_CLIENT_PATH"
+
+    python3 "$runner" batch "$roots_file" \
+        --vault-path "$OBSIDIAN_VAULT_PATH" \
+        --depth "$depth" \
+        --out-dir "$O2P_OUTPUT_DIR/batch"
+}
+
+# Warm daemon: keeps the vault index, file cache and token cache in memory
+function o2p-serve {
+    if python3 "$O2P_CLIENT_PATH" --ping >/dev/null 2>&1; then
+        echo "o2p daemon already running"
+        return 0
+    fi
+    nohup python3 "$O2P_SCRIPT_PATH" --serve >"$O2P_OUTPUT_DIR/o2p-serve.log" 2>&1 &
+    echo "o2p daemon started (log: $O2P_OUTPUT_DIR/o2p-serve.log)"
+}
+function o2p-stop { python3 "$O2P_CLIENT_PATH" --shutdown; }
+
 # Setup check function
 function o2p-check {
     echo "Checking o2p setup..."
@@ -67,6 +102,12 @@ function o2p-check {
         echo "❌ Vault not found"
     fi
     
+    if python3 "$O2P_CLIENT_PATH" --ping >/dev/null 2>&1; then
+        echo "✅ o2p daemon running"
+    else
+        echo "ℹ️  o2p daemon not running (o2p-serve to start)"
+    fi
+    
     if [ -d "$O2P_OUTPUT_DIR" ]; then
         echo "✅ Output directory exists"
     else
@@ -83,5 +124,10 @@ function o2p-check {
     else
         echo "❌ pyperclip not installed"
     fi
+    if python3 -c "import tiktoken" 2>/dev/null; then
+        echo "✅ tiktoken installed"
+    else
+        echo "❌ tiktoken not installed (token counts will be estimated)"
+    fi
 }
 ##### END OBSIDIAN TO PROMPT #####
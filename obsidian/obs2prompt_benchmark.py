@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for obs2prompt on deterministic synthetic vaults.
+
+A generated vault mimics the real one: nested folders, __SecondBrain and
+Projects_PKM layouts, headings and ^block ids, links with headings, blocks,
+aliases and attachment embeds, Cyrillic and emoji names, the $/@/= name
+prefixes that _normalize_filename probes, and symlinked folders including
+cycles. The same parameters always produce the same vault.
+
+Walk, index, resolution, extraction and render are timed at each vault size
+(best of --repeats runs). --save-baseline stores the results; later runs are
+compared against it and exit with status 1 when a benchmark got slower than
+the tolerance allows.
+
+Before timing anything, cache scenarios that once returned stale aggregates
+are verified (see verify_caches()); a failure also exits with status 1.
+
+Usage:
+    python3 obs2prompt_benchmark.py --save-baseline
+    python3 obs2prompt_benchmark.py --sizes 1000,10000
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import obs2prompt_obsidian_to_prompt as o2p
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'obs2prompt_benchmark_baseline.json')
+MARKER = '.o2p_bench.json'
+
+ASCII_WORDS = ['Project', 'Meeting', 'Idea', 'Research', 'Daily', 'Review', 'Plan', 'Draft', 'Topic', 'Reference']
+CYRILLIC_WORDS = ['Нотатка', 'Проєкт', 'Ідея', 'Задача', 'Зустріч', 'Конспект']
+EMOJI = ['🚀', '📚', '✅', '💡', '🧠']
+PREFIXES = ['$', '@', '=', '$.', '$ ', '$. ']  # Name variants probed by _normalize_filename
+HEADING_WORDS = ['Overview', 'Details', 'Next Steps', 'Notes', 'Summary', 'Open Questions', 'Context', 'Links']
+
+
+def generate_vault(root: str, notes: int, fan_out: int = 5, heading_density: int = 3,
+                   symlinks: int = 4, cycles: int = 2, seed: int = 42) -> dict:
+    """Write a synthetic vault to `root` (reused if it was generated with the same parameters)."""
+    params = {'notes': notes, 'fan_out': fan_out, 'heading_density': heading_density,
+              'symlinks': symlinks, 'cycles': cycles, 'seed': seed}
+    try:
+        with open(os.path.join(root, MARKER), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        if info['params'] == params:
+            return info
+    except (OSError, ValueError, KeyError):
+        pass
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    rng = random.Random(seed)
+
+    # Folder tree: __SecondBrain layouts plus nested areas, roughly 50 notes per folder
+    folders = ['', '__SecondBrain/notes', '_Outputs_AI', 'voice-notes']
+    projects = max(1, notes // 2000)
+    folders += [f"__SecondBrain/Projects_PKM/Project-{p}/notes" for p in range(projects)]
+    while len(folders) < max(8, notes // 50):
+        parent = rng.choice(folders[1:])
+        if parent.count('/') >= 5:
+            continue
+        folders.append(f"{parent}/{rng.choice(ASCII_WORDS + CYRILLIC_WORDS)}-{len(folders)}")
+    for folder in folders:
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    # Note names: links use the base name, files may carry a prefix or the 🌳 suffix
+    entries = []  # (link name, relative path, headings, block ids)
+    for i in range(notes):
+        roll = rng.random()
+        if roll < 0.15:
+            base = f"{rng.choice(CYRILLIC_WORDS)} {i}"
+        elif roll < 0.20:
+            base = f"{rng.choice(ASCII_WORDS)} {rng.choice(EMOJI)} {i}"
+        else:
+            base = f"{rng.choice(ASCII_WORDS)} {i}"
+        roll = rng.random()
+        if roll < 0.10:
+            file_name = f"{rng.choice(PREFIXES)}{base}.md"
+        elif roll < 0.13:
+            file_name = f"{base}🌳.md"
+        else:
+            file_name = f"{base}.md"
+        headings = rng.sample(HEADING_WORDS, min(len(HEADING_WORDS), max(0, heading_density + rng.randint(-1, 1))))
+        blocks = [f"b{i}x{k}" for k in range(rng.randint(0, 2))]
+        entries.append((base, os.path.join(rng.choice(folders), file_name), headings, blocks))
+
+    for i, (base, rel_path, headings, blocks) in enumerate(entries):
+        lines = ['---', f"title: {base}", f"tags: [bench, t{i % 17}]", '---', f"# {base}", '']
+        links = []
+        for _ in range(fan_out):
+            target_base, _, target_headings, target_blocks = entries[rng.randrange(notes)]
+            roll = rng.random()
+            if roll < 0.2 and target_headings:
+                links.append(f"[[{target_base}#{rng.choice(target_headings)}]]")
+            elif roll < 0.3 and target_blocks:
+                links.append(f"[[{target_base}#^{rng.choice(target_blocks)}]]")
+            elif roll < 0.4:
+                links.append(f"[[{target_base}|alias {i}]]")
+            else:
+                links.append(f"[[{target_base}]]")
+        for k, heading in enumerate(headings):
+            lines += [f"{'#' * (2 + k % 2)} {heading}", '',
+                      f"Paragraph {k} of note {i} with some text to extract. " * 3,
+                      ' '.join(links[k::max(1, len(headings))]), '']
+        if not headings:
+            lines += [' '.join(links), '']
+        for block in blocks:
+            lines += [f"- list item for {block} ^{block}", '']
+        if rng.random() < 0.2:
+            lines += [f"![[image-{i}.png]]", '']
+        if rng.random() < 0.1:
+            lines += ['```', f"[[Not a link {i}]]", '```', '']
+        with open(os.path.join(root, rel_path), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+
+    # Hub note linking to a spread of notes, like a real entry point
+    hub_links = [f"[[{entries[rng.randrange(notes)][0]}]]" for _ in range(fan_out * 3)]
+    with open(os.path.join(root, 'Hub.md'), 'w', encoding='utf-8') as f:
+        f.write('# Hub\n\n' + '\n'.join(hub_links) + '\n')
+
+    # Symlinked folders, and symlinks back to an ancestor (cycles)
+    deep = [folder for folder in folders if folder.count('/') >= 2] or folders[1:]
+    for k in range(symlinks):
+        target = rng.choice(folders[1:])
+        os.symlink(os.path.join(root, target), os.path.join(root, rng.choice(folders), f"link-{k}"))
+    for k in range(cycles):
+        folder = rng.choice(deep)
+        ancestor = folder.split('/')[0] if rng.random() < 0.5 else ''
+        os.symlink(os.path.join(root, ancestor), os.path.join(root, folder, f"loop-{k}"))
+
+    info = {'params': params, 'folders': len(folders),
+            'link_names': [entry[0] for entry in entries[:: max(1, notes // 500)]],
+            'sample_paths': [entry[1] for entry in entries[:: max(1, notes // 2000)]]}
+    with open(os.path.join(root, MARKER), 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False)
+    return info
+
+
+def best_of(repeats: int, fn: Callable[[], object]) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def quiet_collector(vault: str, index: Optional[o2p.VaultIndex] = None, **kwargs) -> o2p.ObsidianLinkCollector:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return o2p.ObsidianLinkCollector(vault, index=index, **kwargs)
+
+
+def run_benchmarks(vault: str, info: dict, repeats: int) -> Dict[str, float]:
+    """Time each benchmark on one generated vault (seconds, best of `repeats`)."""
+    results = {}
+    cache_dir = tempfile.mkdtemp(prefix='o2p-bench-cache-')
+    try:
+        walker = o2p.VaultWalker()
+        results['walk'] = best_of(repeats, lambda: sum(len(files) for _, _, files in walker.walk(vault)))
+
+        def build_index():
+            o2p.VaultIndex(vault, o2p.VaultWalker(), cache_dir=cache_dir).rebuild()
+        results['index_build'] = best_of(repeats, build_index)
+
+        def revalidate_index():
+            index = o2p.VaultIndex(vault, o2p.VaultWalker(), cache_dir=cache_dir)
+            index.ensure_fresh()
+        results['index_revalidate'] = best_of(repeats, revalidate_index)
+
+        # Resolution of link names through a warm index, memo empty on every repeat
+        index = o2p.VaultIndex(vault, o2p.VaultWalker(), cache_dir=cache_dir)
+        index.ensure_fresh()
+        names = info['link_names']
+
+        def resolve():
+            collector = quiet_collector(vault, index)
+            with contextlib.redirect_stdout(io.StringIO()):
+                for name in names:
+                    collector._resolve_link(name)
+        results['resolve'] = best_of(repeats, resolve)
+        results['resolve_per_link'] = results['resolve'] / max(1, len(names))
+
+        # Extraction: heading table, sections, blocks and link scanning on notes already in memory
+        contents = []
+        for rel_path in info['sample_paths']:
+            with open(os.path.join(vault, rel_path), 'r', encoding='utf-8') as f:
+                contents.append(f.read())
+
+        def extract():
+            for content in contents:
+                note = o2p.CachedNote('', content)
+                note.links
+                for heading, _, _, _ in note.headings[1:3]:
+                    note.section(heading)
+                note.block('b0x0')
+        results['extract'] = best_of(repeats, extract)
+
+        # Aggregate from the hub (depth 2, warm index and note cache), then rendering alone
+        note_cache = o2p.NoteCache()
+        hub = os.path.join(vault, 'Hub.md')
+
+        def aggregate():
+            collector = quiet_collector(vault, index, max_depth=2, note_cache=note_cache)
+            with contextlib.redirect_stdout(io.StringIO()):
+                return collector, collector.process(hub)
+        results['aggregate'] = best_of(repeats, aggregate)
+        collector, _ = aggregate()
+        results['render'] = best_of(repeats, collector._generate_output)
+        minimal = quiet_collector(vault, index, max_depth=2, note_cache=note_cache, profile='minimal')
+        with contextlib.redirect_stdout(io.StringIO()):
+            minimal.process(hub)
+        results['render_minimal'] = best_of(repeats, minimal._generate_output)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+
+def verify_caches(work_dir: str) -> List[str]:
+    """Check that cached aggregates match a fresh collection in known tricky cases."""
+    failures = []
+    vault = os.path.join(work_dir, 'verify-budget')
+    shutil.rmtree(vault, ignore_errors=True)
+    os.makedirs(vault)
+    files = {'R.md': "# R\n[[Small]] [[Big]]\n", 'Small.md': "small note\n", 'Big.md': "word " * 400}
+    for name, content in files.items():
+        with open(os.path.join(vault, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def collect(cache_aggregates: bool = True) -> int:
+        collector = quiet_collector(vault, max_depth=2, max_tokens=100, cache_aggregates=cache_aggregates)
+        with contextlib.redirect_stdout(io.StringIO()):
+            collector.process(os.path.join(vault, 'R.md'))
+        return len(collector.collected_files)
+
+    # A note pruned by --max-tokens that shrinks below the budget must invalidate the cached aggregate
+    collect()
+    with open(os.path.join(vault, 'Big.md'), 'w', encoding='utf-8') as f:
+        f.write("tiny\n")
+    cached, fresh = collect(), collect(cache_aggregates=False)
+    if cached != fresh:
+        failures.append(f"budget-pruned note shrank: cached aggregate has {cached} files, fresh collection {fresh}")
+    shutil.rmtree(vault, ignore_errors=True)
+    return failures
+
+
+def compare(results: dict, baseline: dict, tolerance: float, floor: float) -> List[str]:
+    """Benchmarks slower than the baseline by more than `tolerance` (and `floor` seconds)."""
+    regressions = []
+    for size, timings in results['sizes'].items():
+        for name, seconds in timings.items():
+            base = baseline.get('sizes', {}).get(size, {}).get(name)
+            if base is None or name.endswith('_per_link'):
+                continue
+            if seconds > base * (1 + tolerance) and seconds - base > floor:
+                regressions.append(f"{size} notes / {name}: {seconds * 1000:.1f} ms vs baseline "
+                                   f"{base * 1000:.1f} ms (+{(seconds / base - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark obs2prompt on deterministic synthetic vaults.')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Comma-separated note counts (default: 1000,10000,100000)')
+    parser.add_argument('--fan-out', type=int, default=5, help='Links per note')
+    parser.add_argument('--heading-density', type=int, default=3, help='Average headings per note')
+    parser.add_argument('--symlinks', type=int, default=4, help='Symlinked folders')
+    parser.add_argument('--cycles', type=int, default=2, help='Folder symlinks pointing back to an ancestor')
+    parser.add_argument('--seed', type=int, default=42, help='Generator seed')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per benchmark, the best one counts')
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'o2p-bench'),
+                        help='Where generated vaults are kept between runs')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline results file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before failing (default: 0.25 = 25%%)')
+    parser.add_argument('--floor-ms', type=float, default=2.0, help='Ignore slowdowns smaller than this many milliseconds')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    failures = verify_caches(args.work_dir)
+    for failure in failures:
+        print(f"❌ Cache verification failed: {failure}")
+    if failures:
+        return 1
+    print("✅ Cache verification passed")
+
+    results = {'python': platform.python_version(), 'platform': platform.platform(),
+               'tiktoken': o2p.tiktoken is not None, 'sizes': {}}
+    for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+        vault = os.path.join(args.work_dir, f"vault-{size}-{args.seed}")
+        start_time = time.perf_counter()
+        info = generate_vault(vault, size, args.fan_out, args.heading_density, args.symlinks, args.cycles, args.seed)
+        print(f"Vault with {size} notes ready in {time.perf_counter() - start_time:.1f}s: {vault}")
+        timings = run_benchmarks(vault, info, args.repeats)
+        results['sizes'][str(size)] = timings
+        for name, seconds in timings.items():
+            print(f"  {name:<18} {seconds * 1000:10.2f} ms")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Baseline saved to: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"ℹ️  No baseline at {args.baseline} (run with --save-baseline to create one)")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('platform') != results['platform']:
+        print(f"⚠️  Baseline was recorded on {baseline.get('platform')}, timings may not be comparable")
+    regressions = compare(results, baseline, args.tolerance, args.floor_ms / 1000)
+    if regressions:
+        print(f"\n❌ {len(regressions)} PERFORMANCE REGRESSION(S) against {args.baseline}:")
+        for regression in regressions:
+            print(f"❌   {regression}")
+        return 1
+    print(f"\n✅ No regressions against {args.baseline} (tolerance {args.tolerance * 100:.0f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Thin client for `obs2prompt_obsidian_to_prompt.py --serve`.
+
+Sends its command line to the warm obs2prompt daemon over a Unix socket and
+prints the daemon's output. When no daemon is listening, it runs the full
+script instead, so it is a drop-in replacement for calling the script.
+
+Usage:
+  python obs2prompt_client.py <note> [obs2prompt options]
+  python obs2prompt_client.py --ping        # Is a daemon listening?
+  python obs2prompt_client.py --shutdown    # Stop the daemon
+"""
+
+import os
+import sys
+import json
+import socket
+import tempfile
+
+SCRIPT_PATH = os.environ.get('O2P_SCRIPT_PATH') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'obs2prompt_obsidian_to_prompt.py')
+
+
+def socket_path() -> str:
+    # Keep in sync with default_socket_path() in obs2prompt_obsidian_to_prompt.py
+    return os.environ.get('O2P_SOCKET') or os.path.join(tempfile.gettempdir(), f"o2p-{os.getuid()}.sock")
+
+
+def request(payload: dict) -> dict:
+    """Send one request and wait for the daemon's JSON reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path())
+        conn.sendall(json.dumps(payload).encode('utf-8'))
+        conn.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b"".join(chunks).decode('utf-8'))
+
+
+def main() -> int:
+    argv = sys.argv[1:]
+    if argv in (['--ping'], ['--shutdown']):
+        payload = {'command': argv[0][2:]}
+    else:
+        payload = {'command': 'run', 'argv': argv, 'cwd': os.getcwd()}
+
+    try:
+        response = request(payload)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if payload['command'] != 'run':
+            print(f"No obs2prompt server listening on {socket_path()}")
+            return 1
+        # No daemon: fall back to a regular (cold) run of the script
+        os.execv(sys.executable, [sys.executable, SCRIPT_PATH] + argv)
+
+    sys.stdout.write(response.get('stdout', ''))
+    return response.get('exit_code', 1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
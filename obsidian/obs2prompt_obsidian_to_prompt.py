@@ -8,169 +8,2357 @@ ObsidianToPrompt - Process Obsidian vault links and extract content.
 import re
 import os
 import sys
+import json
 import argparse
-import subprocess
-from typing import List, Tuple, Optional, Dict, Set
+import base64
+import hashlib
+import io
+import shutil
+import socket
+import select
+import struct
+import tempfile
+import traceback
+import contextlib
+import unicodedata
+from typing import List, Tuple, Optional, Dict, Set, Callable, Iterable, NamedTuple
 from datetime import datetime
 try:
     import pyperclip
 except ImportError:
     pyperclip = None
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 import time
+import stat
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Embeds/links with these extensions never resolve to a markdown note
+ATTACHMENT_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp', '.avif', '.heic', '.tif', '.tiff',
+    '.mp3', '.wav', '.m4a', '.ogg', '.flac', '.3gp', '.webm',
+    '.mp4', '.mov', '.mkv', '.ogv', '.avi',
+    '.pdf', '.canvas', '.excalidraw', '.zip', '.csv', '.xlsx', '.docx', '.pptx',
+}
+
+# One pass over the note: fenced-code delimiters, inline code spans and wikilinks
+_LINK_TOKEN_RE = re.compile(
+    r'^[ \t]{0,3}(?P<fence>`{3,}|~{3,})[^\n]*$'
+    r'|(?P<code>`+)[^`\n]+?(?P=code)'
+    r'|(?P<embed>!?)\[\[(?P<body>[^\[\]\n]+?)\]\]',
+    re.MULTILINE,
+)
+
+
+class WikiLink(NamedTuple):
+    """A parsed [[target#heading^block|alias]] link."""
+    target: str
+    heading: Optional[str]
+    block: Optional[str]
+    alias: Optional[str]
+    embed: bool
+    kind: str  # 'note', 'attachment' or 'self' ([[#heading]] within the same note)
+
+    @property
+    def section(self) -> Optional[str]:
+        """Heading or '^block' key used for section extraction and visited tracking."""
+        if self.block:
+            return f"^{self.block}"
+        return self.heading
+
+
+def parse_wikilink(body: str, embed: bool = False) -> WikiLink:
+    """Split the inside of [[...]] into target, heading, block and alias."""
+    alias = None
+    if '|' in body:
+        body, alias = body.split('|', 1)
+        body = body.rstrip('\\')  # [[note\|alias]] inside markdown tables
+        alias = alias.strip() or None
+    heading = block = None
+    if '#' in body:
+        body, heading = body.split('#', 1)
+        # Nested heading paths ([[note#H1#H2]]) target the last heading
+        heading = heading.split('#')[-1].strip() or None
+    if heading and heading.startswith('^'):
+        block, heading = heading[1:], None
+    elif '^' in body:
+        body, block = body.split('^', 1)
+    target = body.strip()
+    block = block.strip() if block else None
+
+    if not target:
+        kind = 'self'
+    elif os.path.splitext(target)[1].lower() in ATTACHMENT_EXTENSIONS:
+        kind = 'attachment'
+    else:
+        kind = 'note'
+    return WikiLink(target, heading, block or None, alias, embed, kind)
+
+
+def scan_wikilinks(content: str) -> List[WikiLink]:
+    """Tokenize all wikilinks in a note, skipping fenced code blocks and inline code."""
+    links = []
+    fence = None  # Opening fence of the code block we are in
+    for match in _LINK_TOKEN_RE.finditer(content):
+        marker = match.group('fence')
+        if marker:
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence) and not match.group(0).strip()[len(marker):]:
+                fence = None
+            continue
+        if fence is not None or match.group('code'):
+            continue
+        links.append(parse_wikilink(match.group('body'), embed=bool(match.group('embed'))))
+    return links
+
+
+def default_cache_dir(vault_path: str) -> str:
+    """Directory for obs2prompt caches (dot-prefixed, so vault walks skip it)."""
+    return os.environ.get('O2P_CACHE_DIR') or os.path.join(vault_path, '.o2p_cache')
+
+
+_HEADING_PUNCT_RE = re.compile(r'[:_\-]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_heading(text: str) -> str:
+    """Normalize heading text for matching (case-insensitive, ':_-' and runs of spaces as one space)."""
+    return _WHITESPACE_RE.sub(' ', _HEADING_PUNCT_RE.sub(' ', text.strip().lower())).strip()
+
+
+def name_key(name: str) -> str:
+    """Key matching a file name regardless of case and Unicode form (NFC, casefolded, trimmed).
+
+    Notes synced from macOS carry NFD-decomposed names, while links are usually
+    typed in NFC; both map to the same key.
+    """
+    name = name.strip()
+    if name.isascii():
+        return name.lower()  # Already NFC, and casefold() equals lower() for ASCII
+    return unicodedata.normalize('NFC', unicodedata.normalize('NFC', name).casefold())
+
+
+class CachedNote:
+    """A note read once per run, with its lines, heading table and links built on demand."""
+
+    __slots__ = ('path', 'content', 'identity', 'mtime_ns', 'size', '_lines', '_headings', '_heading_lookup', '_links')
+
+    def __init__(self, path: str, content: str, identity: Tuple[int, int] = None,
+                 mtime_ns: int = 0, size: int = 0):
+        self.path = path
+        self.content = content
+        self.identity = identity  # (st_dev, st_ino) of the real file
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self._lines = None
+        self._headings = None  # [(normalized_text, level, start_line, end_line)]
+        self._heading_lookup = None  # {normalized_text: index of first heading with that text}
+        self._links = None
+
+    @property
+    def lines(self) -> List[str]:
+        if self._lines is None:
+            self._lines = self.content.splitlines()
+        return self._lines
+
+    @property
+    def headings(self) -> List[Tuple[str, int, int, int]]:
+        """Heading table; a section ends at the next heading of the same or lower level."""
+        if self._headings is None:
+            headings = []
+            open_headings = []  # Indices of headings whose end is not known yet
+            for i, line in enumerate(self.lines):
+                stripped_line = line.strip()
+                if not stripped_line.startswith('#'):
+                    continue
+                level = stripped_line.count('#', 0, 6) # Max heading level 6
+                # Heading text after the # symbols, handling ### Header ### style
+                heading_text = normalize_heading(stripped_line[level:].strip().rstrip('#'))
+                while open_headings and headings[open_headings[-1]][1] >= level:
+                    index = open_headings.pop()
+                    text, open_level, start, _ = headings[index]
+                    headings[index] = (text, open_level, start, i)
+                headings.append((heading_text, level, i, len(self.lines)))
+                open_headings.append(len(headings) - 1)
+            self._headings = headings
+            self._heading_lookup = {}
+            for index, (text, _, _, _) in enumerate(headings):
+                self._heading_lookup.setdefault(text, index)
+        return self._headings
+
+    @property
+    def links(self) -> List['WikiLink']:
+        if self._links is None:
+            self._links = scan_wikilinks(self.content)
+        return self._links
+
+    def section(self, heading: str) -> Optional[str]:
+        """Return the section under `heading` (including the heading line), or None."""
+        headings = self.headings
+        index = self._heading_lookup.get(normalize_heading(heading))
+        if index is None:
+            return None
+        _, _, start, end = headings[index]
+        return "\n".join(self.lines[start:end])
+
+    def block(self, block_id: str) -> Optional[str]:
+        """Return the paragraph or list item tagged with ^block_id, or None."""
+        lines = self.lines
+        marker = f"^{block_id}"
+        for i, line in enumerate(lines):
+            if line.rstrip().endswith(marker):
+                # Walk back to the start of the paragraph
+                start = i
+                is_list_item = lines[i].lstrip().startswith(('-', '*'))
+                while (start > 0 and not is_list_item and lines[start - 1].strip()
+                       and not lines[start - 1].lstrip().startswith('#')):
+                    start -= 1
+                return "\n".join(lines[start:i + 1])
+        return None
+
+
+class CollectedNote:
+    """One collected file or section, in collection order."""
+
+    __slots__ = ('path', 'heading', 'content', 'depth', 'aliases')
+
+    def __init__(self, path: str, heading: Optional[str], content: str, depth: int,
+                 aliases: Optional[List[str]] = None):
+        self.path = path
+        self.heading = heading  # Heading or '^block' the content was extracted for
+        self.content = content
+        self.depth = depth
+        self.aliases = aliases if aliases is not None else [path]  # Every path seen for the same real file
+
+
+class TokenCounter:
+    """In-process token counter with a persistent cache keyed by content hash.
+
+    Uses tiktoken with the selected encoding when it is installed; otherwise
+    falls back to a ~4 characters per token estimate (not cached, it is free).
+
+    Each cached count remembers the day it was last used. Counts unused for
+    MAX_IDLE_DAYS are dropped on save, and beyond MAX_ENTRIES the least
+    recently used go first, so the file follows the vault, not its history.
+    """
+
+    DEFAULT_ENCODING = 'cl100k_base'
+    VERSION = 2
+    MAX_ENTRIES = 100_000
+    MAX_IDLE_DAYS = 30
+
+    def __init__(self, encoding: str = DEFAULT_ENCODING, cache_dir: Optional[str] = None,
+                 debug: Callable[[str], None] = None):
+        self._debug = debug or (lambda msg: None)
+        self.encoding_name = encoding
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                print(f"WARNING: Cannot load tiktoken encoding '{encoding}': {e}. Estimating tokens.", file=sys.stderr)
+        self.cache_path = os.path.join(cache_dir, 'token_counts.json') if cache_dir else None
+        self._cache: Optional[Dict[str, List[int]]] = None  # {key: [count, day last used]}
+        self._dirty = False
+        self._today = int(time.time() // 86400)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def method(self) -> str:
+        """Human readable name of what the counts mean."""
+        return self.encoding_name if self._encoding is not None else 'estimated'
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        """Count tokens for many texts, encoding only the ones not seen before in one batch."""
+        if self._encoding is None:
+            return [(len(text) + 3) // 4 for text in texts]
+
+        keys = [f"{self.encoding_name}:{hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()}"
+                for text in texts]
+        missing = {}  # key -> text, de-duplicated
+        with self._lock:
+            self._today = int(time.time() // 86400)  # Long-lived processes see days go by
+            cache = self._load()
+            counts = []
+            for key, text in zip(keys, texts):
+                entry = cache.get(key)
+                if entry is None:
+                    counts.append(None)
+                    missing.setdefault(key, text)
+                    continue
+                counts.append(entry[0])
+                if entry[1] != self._today:
+                    entry[1] = self._today  # Saved at most once a day per count
+                    self._dirty = True
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            encoded = self._encoding.encode_ordinary_batch(list(missing.values()))
+            new_counts = dict(zip(missing, map(len, encoded)))
+            with self._lock:
+                for key, count in new_counts.items():
+                    cache[key] = [count, self._today]
+                self._dirty = True
+            counts = [new_counts[key] if count is None else count for key, count in zip(keys, counts)]
+        return counts
+
+    def save(self) -> None:
+        """Persist newly counted hashes."""
+        with self._lock:
+            if not self._dirty or not self.cache_path:
+                return
+            self._evict()
+            tmp_path = f"{self.cache_path}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'version': self.VERSION, 'counts': self._cache}, f)
+                os.replace(tmp_path, self.cache_path)
+                self._dirty = False
+            except OSError as e:
+                self._debug(f"Could not save token cache to {self.cache_path}: {e}")
+
+    def _evict(self) -> None:
+        """Drop counts idle for MAX_IDLE_DAYS, then the least recently used beyond MAX_ENTRIES."""
+        oldest = self._today - self.MAX_IDLE_DAYS
+        kept = {key: entry for key, entry in self._cache.items() if entry[1] >= oldest}
+        if len(kept) > self.MAX_ENTRIES:
+            recent = sorted(kept, key=lambda key: kept[key][1], reverse=True)[:self.MAX_ENTRIES]
+            kept = {key: kept[key] for key in recent}
+        if len(kept) < len(self._cache):
+            self._debug(f"Token cache: dropped {len(self._cache) - len(kept)} unused counts")
+            self._cache = kept
+
+    def _load(self) -> Dict[str, List[int]]:
+        if self._cache is None:
+            self._cache = {}
+            if self.cache_path:
+                try:
+                    with open(self.cache_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    data = {}
+                if data.get('version') == self.VERSION:
+                    self._cache = data.get('counts', {})
+                else:  # Version 1: {key: count}
+                    self._cache = {key: [count, self._today] for key, count in data.items() if isinstance(count, int)}
+        return self._cache
+
+
+_FRONTMATTER_RE = re.compile(r'\A---[ \t]*\n.*?\n---[ \t]*(?:\n|\Z)', re.DOTALL)
+_DATA_URI_IMAGE_RE = re.compile(r'!\[[^\]\n]*\]\(\s*<?data:[^)\s]*\)|<img\b[^>]*\bsrc\s*=\s*["\']data:[^"\']*["\'][^>]*>', re.IGNORECASE)
+_DATA_URI_RE = re.compile(r'data:[\w.+-]+/[\w.+-]+(?:;[\w=.+-]+)*;base64,[A-Za-z0-9+/=\s]{64,}')
+_WIKI_EMBED_RE = re.compile(r'!\[\[([^\]\n]+)\]\]')
+_MARKDOWN_EMBED_RE = re.compile(r'!\[[^\]\n]*\]\(\s*<?([^)\s>]+)>?[^)\n]*\)')
+_TRAILING_SPACE_RE = re.compile(r'[ \t]+$', re.MULTILINE)
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+
+class RenderProfile:
+    """Output-shrinking transformations applied to every collected section.
+
+    'raw' emits notes verbatim. 'compact' strips YAML frontmatter and data
+    URIs and collapses whitespace. 'minimal' also drops attachment embeds and
+    replaces blocks (paragraphs) already emitted for an earlier note with a
+    reference to it. Bytes and tokens saved are tallied per transformation:
+    only a section's input and final output are tokenized, and the tokens
+    saved are shared among the steps by the characters each one removed.
+    """
+
+    PROFILES = {
+        'raw': (),
+        'compact': ('frontmatter', 'data-uris', 'whitespace'),
+        'minimal': ('frontmatter', 'data-uris', 'attachments', 'whitespace', 'repeated-blocks'),
+    }
+    MIN_REPEATED_BLOCK = 80  # Shorter blocks (headings, rules, short list items) are always kept
+
+    def __init__(self, name: str = 'raw', count_tokens: Optional[Callable[[List[str]], List[int]]] = None):
+        if name not in self.PROFILES:
+            raise ValueError(f"Unknown render profile '{name}' (choose from {', '.join(self.PROFILES)})")
+        self.name = name
+        self.steps = self.PROFILES[name]
+        self._count_tokens = count_tokens
+        self.saved: Dict[str, List[int]] = {step: [0, 0] for step in self.steps}  # step -> [bytes, tokens]
+        self._seen_blocks: Dict[bytes, str] = {}  # Block hash -> source that emitted it first
+        self._pending: Optional[Tuple[Dict[str, Tuple[int, int]], Dict[bytes, str]]] = None
+
+    def apply(self, content: str, source: str) -> str:
+        """Transform one section; savings and new blocks count only once commit() is called."""
+        savings: Dict[str, Tuple[int, int]] = {}
+        self._pending = (savings, {})
+        original = content
+        removed: Dict[str, Tuple[int, int]] = {}  # step -> (bytes, characters)
+        for step in self.steps:
+            if step == 'repeated-blocks':
+                result = self._repeated_blocks(content, source)
+            else:
+                result = getattr(self, f"_{step.replace('-', '_')}")(content)
+            if result != content:
+                removed[step] = (len(content.encode('utf-8')) - len(result.encode('utf-8')), len(content) - len(result))
+                content = result
+        if removed:
+            before, after = self._count_tokens([original, content]) if self._count_tokens else (0, 0)
+            # Intermediate texts are not tokenized (nor cached): steps share the saving by characters
+            weights = {step: max(chars, 0) for step, (_, chars) in removed.items()}
+            total_weight = sum(weights.values())
+            left = before - after
+            for position, (step, (saved_bytes, _)) in enumerate(removed.items()):
+                if position == len(removed) - 1:
+                    tokens = left
+                else:
+                    tokens = round((before - after) * weights[step] / total_weight) if total_weight else 0
+                savings[step] = (saved_bytes, tokens)
+                left -= tokens
+        return content
+
+    def commit(self) -> None:
+        """Account for the section returned by the last apply(), which is being emitted."""
+        if self._pending is None:
+            return
+        savings, blocks = self._pending
+        for step, (saved_bytes, saved_tokens) in savings.items():
+            self.saved[step][0] += saved_bytes
+            self.saved[step][1] += saved_tokens
+        for digest, source in blocks.items():
+            self._seen_blocks.setdefault(digest, source)
+        self._pending = None
+
+    def _frontmatter(self, content: str) -> str:
+        return _FRONTMATTER_RE.sub('', content, count=1)
+
+    def _data_uris(self, content: str) -> str:
+        content = _DATA_URI_IMAGE_RE.sub('', content)
+        return _DATA_URI_RE.sub('[data URI removed]', content)
+
+    def _attachments(self, content: str) -> str:
+        def drop(match):
+            target = match.group(1).split('|', 1)[0].split('#', 1)[0]
+            return '' if os.path.splitext(target.strip())[1].lower() in ATTACHMENT_EXTENSIONS else match.group(0)
+        return _MARKDOWN_EMBED_RE.sub(drop, _WIKI_EMBED_RE.sub(drop, content))
+
+    def _whitespace(self, content: str) -> str:
+        content = _TRAILING_SPACE_RE.sub('', content)
+        return _BLANK_LINES_RE.sub('\n\n', content).strip('\n')
+
+    def _repeated_blocks(self, content: str, source: str) -> str:
+        # Blocks are runs of lines between blank lines and headings, which are kept as they are
+        _, new_blocks = self._pending
+        output: List[str] = []
+        block: List[str] = []
+
+        def flush():
+            text = "\n".join(block).strip()
+            if len(text) >= self.MIN_REPEATED_BLOCK:
+                digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+                first_source = self._seen_blocks.get(digest)
+                if first_source is not None and first_source != source:
+                    output.append(f"[repeated block, see {first_source}]")
+                    block.clear()
+                    return
+                new_blocks.setdefault(digest, source)
+            output.extend(block)
+            block.clear()
+
+        for line in content.split('\n'):
+            if not line.strip() or line.lstrip().startswith('#'):
+                flush()
+                output.append(line)
+            else:
+                block.append(line)
+        flush()
+        return "\n".join(output)
+
+
+class AggregateCache:
+    """Manifests of previous aggregates, so unchanged closures are not collected again.
+
+    A manifest records the parameters of an aggregate, the resolution of every
+    link target followed, and the stat (device, inode, mtime, size) of every
+    note read: the collected ones and the one that did not fit a budget. The
+    output itself is kept next to it. Validating it takes stat calls only: when
+    nothing changed the stored output is returned with a fresh timestamp,
+    otherwise the whole closure is read and collected again, reusing only the
+    link resolutions (outside the daemon, whose note cache is warm, that saves
+    little over --no-cache).
+
+    Entries are evicted least recently used first once there are more than
+    MAX_ENTRIES of them or they take more than MAX_BYTES.
+    """
+
+    VERSION = 2
+    MAX_ENTRIES = 64
+    MAX_BYTES = 256 * 1024 * 1024
+    TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+    TIMESTAMP_PREFIX = '- Generated on: '
+
+    def __init__(self, cache_dir: str, debug: Callable[[str], None] = None):
+        self.directory = os.path.join(cache_dir, 'aggregates')
+        self._debug = debug or (lambda msg: None)
+
+    def key(self, params: dict) -> str:
+        return hashlib.blake2b(json.dumps(params, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+
+    def load(self, key: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.directory, f"{key}.json"), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get('version') == self.VERSION else None
+
+    def output_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.out")
+
+    def output(self, key: str, manifest: dict) -> Optional[str]:
+        """The stored output with its timestamp set to now."""
+        try:
+            with open(self.output_path(key), 'rb') as f:
+                data = bytearray(f.read())
+        except OSError:
+            return None
+        offset = manifest.get('timestamp_offset')
+        if offset is not None:
+            stamp = datetime.now().strftime(self.TIMESTAMP_FORMAT).encode('ascii')
+            data[offset:offset + len(stamp)] = stamp
+        self.touch(key)
+        try:
+            return data.decode('utf-8')
+        except UnicodeError:
+            return None
+
+    def copy_output(self, key: str, manifest: dict, destination: str) -> bool:
+        """Copy the stored output to `destination` (without loading it) and set its timestamp to now."""
+        try:
+            shutil.copyfile(self.output_path(key), destination)
+            offset = manifest.get('timestamp_offset')
+            if offset is not None:
+                with open(destination, 'r+b') as f:
+                    f.seek(offset)
+                    f.write(datetime.now().strftime(self.TIMESTAMP_FORMAT).encode('ascii'))
+        except OSError as e:
+            self._debug(f"Could not copy cached aggregate {key}: {e}")
+            return False
+        self.touch(key)
+        return True
+
+    def touch(self, key: str) -> None:
+        """Mark an entry as used now (eviction is least recently used first)."""
+        for suffix in ('json', 'out'):
+            try:
+                os.utime(os.path.join(self.directory, f"{key}.{suffix}"))
+            except OSError:
+                pass
+
+    def unchanged_notes(self, manifest: dict) -> Tuple[int, int]:
+        """How many notes of the manifest still match their stat, and how many changed or vanished."""
+        unchanged = changed = 0
+        for path, (dev, ino, mtime_ns, size) in manifest['notes'].items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                changed += 1
+                continue
+            if (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size) == (dev, ino, mtime_ns, size):
+                unchanged += 1
+            else:
+                changed += 1
+        return unchanged, changed
+
+    def store(self, key: str, manifest: dict, output: Optional[str] = None,
+              output_file: Optional[str] = None) -> None:
+        """Store a manifest with its output, given as text or as the file it was streamed to."""
+        manifest['version'] = self.VERSION
+        path = os.path.join(self.directory, key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if output_file is not None:
+                shutil.copyfile(output_file, f"{path}.out.tmp")
+                with open(output_file, 'rb') as f:
+                    head = f.read(4096)
+            else:
+                with open(f"{path}.out.tmp", 'w', encoding='utf-8') as f:
+                    f.write(output)
+                head = output[:4096].encode('utf-8')
+            offset = head.find(self.TIMESTAMP_PREFIX.encode('ascii'))
+            manifest['timestamp_offset'] = offset + len(self.TIMESTAMP_PREFIX) if offset >= 0 else None
+            with open(f"{path}.json.tmp", 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(f"{path}.out.tmp", f"{path}.out")
+            os.replace(f"{path}.json.tmp", f"{path}.json")
+        except OSError as e:
+            self._debug(f"Could not save aggregate manifest {key}: {e}")
+            return
+        self._evict(keep=key)
+
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used entries beyond MAX_ENTRIES / MAX_BYTES."""
+        entries: Dict[str, List[float]] = {}  # {key: [last use, bytes]}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    key, _, suffix = entry.name.partition('.')
+                    if suffix not in ('json', 'out'):
+                        continue
+                    st = entry.stat()
+                    record = entries.setdefault(key, [0.0, 0])
+                    record[0] = max(record[0], st.st_mtime)
+                    record[1] += st.st_size
+        except OSError:
+            return
+        total = sum(size for _, size in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k][0]):
+            if len(entries) <= self.MAX_ENTRIES and total <= self.MAX_BYTES:
+                break
+            if key == keep:
+                continue
+            for suffix in ('json', 'out'):
+                try:
+                    os.unlink(os.path.join(self.directory, f"{key}.{suffix}"))
+                except OSError:
+                    pass
+            total -= entries.pop(key)[1]
+            self._debug(f"Aggregate cache: evicted {key}")
+
+
+class StreamingAggregateWriter:
+    """Writes an aggregate to disk while files are collected, counting statistics on the fly.
+
+    The file structure is only complete at the end of the run, so it is written
+    as a trailer after the content sections, or to a separate sidecar file.
+    """
+
+    def __init__(self, output_path: str, structure_path: Optional[str] = None,
+                 count_tokens: Callable[[str], int] = None):
+        self.output_path = output_path
+        self._count_tokens = count_tokens or (lambda text: len(text.split()))
+        self.structure_path = structure_path
+        self.file_count = 0
+        self.total_lines = 0
+        self.total_bytes = 0
+        self.total_tokens = 0
+        self._file = open(output_path, 'w', encoding='utf-8')
+
+    def write(self, text: str) -> None:
+        self._file.write(text)
+
+    def write_entry(self, section: str, content: str, tokens: Optional[int] = None) -> None:
+        """Write one rendered section and account for its content (`tokens` if already counted)."""
+        self._file.write(section)
+        self._file.write("\n")
+        self.file_count += 1
+        self.total_lines += len(content.splitlines())
+        self.total_bytes += len(content.encode('utf-8'))
+        self.total_tokens += tokens if tokens is not None else self._count_tokens(content)
+
+    def write_structure(self, tree: str) -> None:
+        """Write the file structure to the sidecar file, or as a trailer section."""
+        structure = f"## File Structure\n\n{tree}\n\n\n"
+        if self.structure_path:
+            with open(self.structure_path, 'w', encoding='utf-8') as f:
+                f.write(structure)
+        else:
+            self._file.write(structure)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class NoteCache:
+    """Cache of notes, keyed by path (per run) and by real file identity (across runs)."""
+
+    def __init__(self):
+        self._by_path: Dict[str, CachedNote] = {}
+        self._by_identity: Dict[Tuple[int, int], CachedNote] = {}
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def begin_run(self) -> None:
+        """Forget path lookups; notes are then re-validated by fstat (mtime, size) on next use."""
+        with self._lock:
+            self._by_path.clear()
+
+    def get(self, path: str) -> CachedNote:
+        """Return the cached note for `path`, reading it on first use (raises OSError/UnicodeError)."""
+        with self._lock:
+            if path in self._by_path:
+                return self._by_path[path]
+        note = self._read(path)
+        with self._lock:
+            self._by_path[path] = note
+        return note
+
+    def peek(self, path: str) -> Optional[CachedNote]:
+        """The note already read (or seeded) for `path` in this run, if any."""
+        with self._lock:
+            return self._by_path.get(path)
+
+    def _read(self, path: str) -> CachedNote:
+        # open() resolves symlinks; fstat identifies the real file behind any alias path
+        with open(path, 'r', encoding='utf-8') as f:
+            st = os.fstat(f.fileno())
+            identity = (st.st_dev, st.st_ino)
+            with self._lock:
+                cached = self._by_identity.get(identity)
+            if cached is not None and cached.mtime_ns == st.st_mtime_ns and cached.size == st.st_size:
+                return cached
+            content = f.read()
+        note = CachedNote(path, content, identity, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            self._by_identity[identity] = note
+            self.reads += 1
+        return note
+
+
+SERVE_RECV_TIMEOUT = 10.0  # Seconds a --serve client gets to send its request
+
+
+def default_socket_path() -> str:
+    """Unix socket of the --serve daemon (per user)."""
+    return os.environ.get('O2P_SOCKET') or os.path.join(tempfile.gettempdir(), f"o2p-{os.getuid()}.sock")
+
+
+class IgnoreRules:
+    """gitignore-style rules deciding which vault entries walks skip.
+
+    Built-in defaults (hidden entries, temp, dependency and cache folders) come
+    first, then the vault's .o2pignore, so its patterns (including `!`
+    negations) override them. Patterns follow gitignore: `#` comments,
+    trailing `/` for directories only, a `/` at the start or in the middle
+    anchors to the vault root, `*`, `?`, `[...]` and `**`. A pruned directory
+    is never listed, so nothing below it can be re-included.
+
+    All rules are compiled once; without negations they are merged into one
+    regular expression per entry type.
+    """
+
+    FILE_NAME = '.o2pignore'
+    DEFAULTS = ['.*', 'temp', 'node_modules/', 'bower_components/', '__pycache__/', 'venv/',
+                'site-packages/', '*.photoslibrary/']
+
+    def __init__(self, patterns: Iterable[str]):
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []  # (regex, negated, directories only)
+        for pattern in patterns:
+            rule = self._compile(pattern)
+            if rule is not None:
+                self.rules.append(rule)
+        self.digest = hashlib.blake2b("\n".join(f"{regex.pattern}\0{negated}\0{dir_only}"
+                                                for regex, negated, dir_only in self.rules).encode('utf-8'),
+                                      digest_size=8).hexdigest()
+        self._merged = None
+        if not any(negated for _, negated, _ in self.rules):
+            # First match is enough: one alternation for directories, one for files
+            dirs = [regex.pattern for regex, _, _ in self.rules]
+            files = [regex.pattern for regex, _, dir_only in self.rules if not dir_only]
+            self._merged = (re.compile('|'.join(f"(?:{p})" for p in dirs) or r'(?!)'),
+                            re.compile('|'.join(f"(?:{p})" for p in files) or r'(?!)'))
+
+    @classmethod
+    def load(cls, vault_path: str) -> 'IgnoreRules':
+        """Built-in defaults plus `<vault>/.o2pignore` (if present)."""
+        patterns = list(cls.DEFAULTS)
+        try:
+            with open(os.path.join(vault_path, cls.FILE_NAME), 'r', encoding='utf-8') as f:
+                patterns.extend(f.read().splitlines())
+        except OSError:
+            pass
+        return cls(patterns)
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """Whether an entry, given by its '/'-separated path relative to the vault, is skipped."""
+        if self._merged is not None:
+            return self._merged[0 if is_dir else 1].match(rel_path) is not None
+        for regex, negated, dir_only in reversed(self.rules):
+            if (is_dir or not dir_only) and regex.match(rel_path):
+                return not negated  # The last matching rule wins
+        return False
+
+    @staticmethod
+    def _compile(pattern: str) -> Optional[Tuple[re.Pattern, bool, bool]]:
+        if pattern.endswith(' ') and not pattern.endswith('\\ '):
+            pattern = pattern.rstrip(' ')
+        if not pattern or pattern.startswith('#'):
+            return None
+        negated = pattern.startswith('!')
+        if negated:
+            pattern = pattern[1:]
+        elif pattern.startswith(('\\!', '\\#')):
+            pattern = pattern[1:]
+        dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        if not pattern:
+            return None
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+
+        parts = []
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith('**/', i):
+                parts.append('(?:.*/)?')
+                i += 3
+            elif pattern.startswith('**', i):
+                parts.append('.*')
+                i += 2
+            elif pattern[i] == '*':
+                parts.append('[^/]*')
+                i += 1
+            elif pattern[i] == '?':
+                parts.append('[^/]')
+                i += 1
+            elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+                end = pattern.index(']', i + 2)
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+                i = end + 1
+            elif pattern[i] == '\\' and i + 1 < len(pattern):
+                parts.append(re.escape(pattern[i + 1]))
+                i += 2
+            else:
+                parts.append(re.escape(pattern[i]))
+                i += 1
+        body = ''.join(parts)
+        regex = f"{body}$" if anchored else f"(?:.*/)?{body}$"
+        return re.compile(regex), negated, dir_only
+
+
+class VaultWalker:
+    """Breadth-first vault walker that follows symlinks and skips hidden/temp entries.
+
+    With `ignore` rules (and the vault root they are relative to), entries are
+    skipped by those rules instead; an ignored directory is never listed.
+
+    Each entry costs at most one syscall beyond the directory listing: the
+    type and inode come from the DirEntry (d_type/d_ino), and only symlinks
+    are stat()ed to find their target. Every real directory, identified by
+    (st_dev, st_ino), is scanned at most once, so symlink cycles terminate
+    and two links to the same folder are only walked through the first one.
+    `counters` accumulates the syscalls made across walks.
+    """
+
+    MAX_DEPTH = 15
+
+    def __init__(self, debug: Callable[[str], None] = None, max_depth: int = MAX_DEPTH,
+                 ignore: Optional[IgnoreRules] = None, root: Optional[str] = None):
+        self._debug = debug or (lambda msg: None)
+        self.max_depth = max_depth
+        self.ignore = ignore
+        self.root = root.rstrip(os.sep) if root else None
+        self.counters = {'scandir': 0, 'stat': 0, 'dirs': 0, 'pruned': 0, 'files': 0}
+
+    @property
+    def rules_digest(self) -> str:
+        """Identifies the filtering rules, so caches built with other rules are not reused."""
+        return self.ignore.digest if self.ignore is not None else 'hidden+temp'
+
+    def ignores(self, path: str, is_dir: bool) -> bool:
+        """Whether the walk would skip `path` (a directory if `is_dir`)."""
+        name = os.path.basename(path)
+        if self.ignore is None or self.root is None:
+            return name.startswith('.') or name == 'temp'
+        if not path.startswith(self.root + os.sep):
+            return False
+        return self.ignore.ignored(path[len(self.root) + 1:].replace(os.sep, '/'), is_dir)
+
+    def walk(self, top: str):
+        """Yield (path, dir_names, file_names) for `top` and the directories below it."""
+        start_counters = dict(self.counters)
+        self.counters['stat'] += 1
+        try:
+            top_stat = os.stat(top)
+        except OSError as e:
+            self._debug(f"Cannot stat starting path {top}: {e}. Aborting walk.")
+            return
+        self._debug(f"Starting walk from: {top} (inode {(top_stat.st_dev, top_stat.st_ino)})")
+
+        visited = set()  # (st_dev, st_ino) of real directories already scanned
+        queue = deque([(top, 0, (top_stat.st_dev, top_stat.st_ino))])
+        while queue:
+            current_path, current_depth, identity = queue.popleft()
+            if identity in visited:
+                self._debug(f"Cycle detected (directory already visited): {current_path} (inode {identity})")
+                continue
+            visited.add(identity)
+
+            listing = self._scan(current_path, identity[0])
+            if listing is None:
+                continue
+            subdirs, files = listing
+            dir_names = []
+            for name, sub_identity in subdirs:
+                if sub_identity in visited:
+                    self._debug(f"Skipping directory - inode already visited: {os.path.join(current_path, name)}")
+                    continue
+                dir_names.append(name)
+                if current_depth < self.max_depth:
+                    queue.append((os.path.join(current_path, name), current_depth + 1, sub_identity))
+            yield current_path, dir_names, files
+
+        walked = {key: self.counters[key] - start_counters[key] for key in self.counters}
+        self._debug(f"Walk of {top} finished: {walked}")
+
+    def list_dir(self, path: str) -> Optional[Tuple[List[str], List[str]]]:
+        """List one directory with the walk's filtering rules: (dir_names, file_names)."""
+        self.counters['stat'] += 1
+        try:
+            dev = os.stat(path).st_dev
+        except OSError as e:
+            self._debug(f"Cannot stat {path}: {e}")
+            return None
+        listing = self._scan(path, dev)
+        if listing is None:
+            return None
+        subdirs, files = listing
+        return [name for name, _ in subdirs], files
+
+    def _scan(self, path: str, dev: int) -> Optional[Tuple[List[Tuple[str, Tuple[int, int]]], List[str]]]:
+        """One scandir: [(dir_name, identity)], [file_name]; symlinks are resolved with one stat."""
+        self._debug(f"Scanning directory: {path}")
+        subdirs, files = [], []
+        ignore = self.ignore if self.root is not None else None
+        if ignore is not None:
+            # Entries are matched by their vault-relative path, '/'-separated like gitignore
+            prefix = "" if path == self.root else path[len(self.root) + 1:].replace(os.sep, '/') + '/'
+            if path != self.root and not path.startswith(self.root + os.sep):
+                ignore = None  # Walks outside the vault keep the plain hidden/temp rule
+        try:
+            with os.scandir(path) as entries:
+                self.counters['scandir'] += 1
+                for entry in entries:
+                    # Skip hidden files/dirs and temp
+                    if ignore is None and (entry.name.startswith('.') or entry.name == 'temp'):
+                        continue
+                    try:
+                        if entry.is_symlink():
+                            # The only case that needs a syscall: find out what the link points to
+                            self.counters['stat'] += 1
+                            target = os.stat(entry.path)
+                            is_dir, is_file = stat.S_ISDIR(target.st_mode), stat.S_ISREG(target.st_mode)
+                            identity = (target.st_dev, target.st_ino)
+                        else:
+                            is_dir, is_file = entry.is_dir(follow_symlinks=False), entry.is_file(follow_symlinks=False)
+                            # d_ino of a plain directory on the parent's device; mount points
+                            # report the covered inode here, which is still unique per path
+                            identity = (dev, entry.inode())
+                        if ignore is not None and (is_dir or is_file) and ignore.ignored(prefix + entry.name, is_dir):
+                            if is_dir:
+                                self.counters['pruned'] += 1
+                                self._debug(f"Pruned ignored directory: {entry.path}")
+                            continue
+                        if is_dir:
+                            subdirs.append((entry.name, identity))
+                        elif is_file:
+                            files.append(entry.name)
+                    except OSError as e:
+                        # Broken symlink or entry vanished while scanning
+                        self._debug(f"Skipping entry {entry.path}: {e}")
+        except OSError as e:
+            self._debug(f"Error scanning directory {path}: {e}")
+            return None
+        self.counters['dirs'] += 1
+        self.counters['files'] += len(files)
+        return subdirs, files
+
+
+class VaultIndex:
+    """Persistent basename -> paths index of the vault.
+
+    The index stores every walked directory with its mtime and its file names.
+    Staleness is detected by re-statting the directories: a changed mtime means
+    a file was added, removed or renamed there, so only that directory is
+    re-listed. New or vanished sub-directories trigger a full rebuild.
+
+    In a long-lived process a VaultWatcher can keep the index `live`: it applies
+    create/delete/rename deltas as they happen and no revalidation is needed.
+    """
+
+    VERSION = 1
+
+    def __init__(self, vault_path: str, walker: VaultWalker, cache_dir: Optional[str] = None,
+                 debug: Callable[[str], None] = None, rebuild: bool = False):
+        self.vault_path = vault_path
+        self.walker = walker
+        self._debug = debug or (lambda msg: None)
+        cache_dir = cache_dir or default_cache_dir(vault_path)
+        self.cache_path = os.path.join(cache_dir, 'vault_index.json')
+        self.dirs: Dict[str, dict] = {}  # {dir_path: {'mtime': ns, 'files': [...], 'dirs': [...]}}
+        self.by_name: Dict[str, List[str]] = {}  # {basename: [full_path, ...]}
+        self.by_key: Optional[Dict[str, List[str]]] = None  # {name_key(basename): [full_path, ...]}, built on demand
+        self._ready = False
+        self._force_rebuild = rebuild
+        self._lock = threading.RLock()
+        self.live = False  # True while a watcher keeps the index up to date
+        self.generation = 0  # Bumped on every full rebuild
+        self.dirty = False  # Incremental changes not saved yet
+
+    def begin_run(self, rebuild: bool = False) -> None:
+        """Make the next lookup revalidate the in-memory index (long-lived processes)."""
+        with self._lock:
+            if self.live and not rebuild:
+                return
+            self._ready = False
+            self._force_rebuild = rebuild
+
+    def ensure_fresh(self) -> None:
+        """Load the index from disk and bring it up to date (once per run)."""
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            start_time = time.time()
+            if self._force_rebuild or not (self.dirs or self._load()):
+                self.rebuild()
+            else:
+                self._revalidate()
+            self._ready = True
+            self._force_rebuild = False
+            self._debug(f"Vault index ready: {len(self.dirs)} dirs, {len(self.by_name)} names "
+                        f"({time.time() - start_time:.2f}s)")
+
+    def rebuild(self) -> None:
+        """Walk the whole vault and persist a fresh index."""
+        self._debug(f"Building vault index for {self.vault_path}")
+        with self._lock:
+            self.dirs = {}
+            for root, dirs, files in self.walker.walk(self.vault_path):
+                self._add_dir(root, dirs, files)
+            self._rebuild_names()
+            self.generation += 1
+            self._save()
+
+    def lookup(self, names: Iterable[str]) -> List[str]:
+        """Return all indexed paths whose basename is one of `names`."""
+        matches = []
+        with self._lock:
+            for name in names:
+                matches.extend(self.by_name.get(name, ()))
+        return matches
+
+    def lookup_normalized(self, names: Iterable[str]) -> List[str]:
+        """Return all indexed paths whose basename matches one of `names` by name_key()."""
+        matches = []
+        with self._lock:
+            if self.by_key is None:
+                by_key: Dict[str, List[str]] = {}
+                for name, paths in self.by_name.items():
+                    by_key.setdefault(name_key(name), []).extend(paths)
+                self.by_key = by_key
+            for key in {name_key(name) for name in names}:
+                matches.extend(self.by_key.get(key, ()))
+        return matches
+
+    def signature(self) -> str:
+        """Digest of every indexed directory and its mtime; changes when any file is added or removed."""
+        with self._lock:
+            digest = hashlib.blake2b(digest_size=16)
+            for root in sorted(self.dirs):
+                digest.update(f"{root}\0{self.dirs[root]['mtime']}\0".encode('utf-8', 'surrogateescape'))
+            return digest.hexdigest()
+
+    def paths(self, suffix: str = '') -> List[str]:
+        """All indexed file paths ending with `suffix`."""
+        with self._lock:
+            return [os.path.join(root, name) for root, record in self.dirs.items()
+                    for name in record['files'] if name.endswith(suffix)]
+
+    def add_file(self, root: str, name: str) -> None:
+        """Record a file created in (or moved into) an indexed directory."""
+        with self._lock:
+            record = self.dirs.get(root)
+            if record is None or name in record['files']:
+                return
+            record['files'].append(name)
+            self._add_name(root, name)
+            self._touch(root)
+
+    def remove_file(self, root: str, name: str) -> None:
+        """Forget a file deleted from (or moved out of) an indexed directory."""
+        with self._lock:
+            record = self.dirs.get(root)
+            if record is None or name not in record['files']:
+                return
+            record['files'].remove(name)
+            self._drop_name(root, name)
+            self._touch(root)
+
+    def add_tree(self, path: str) -> List[str]:
+        """Index a new directory and everything below it; returns the newly indexed directories."""
+        parent, name = os.path.split(path)
+        added = []
+        with self._lock:
+            record = self.dirs.get(parent)
+            if record is not None and name not in record['dirs']:
+                record['dirs'].append(name)
+                self._touch(parent)
+            for root, dirs, files in self.walker.walk(path):
+                if root in self.dirs:
+                    continue
+                self._add_dir(root, dirs, files)
+                for file_name in files:
+                    self._add_name(root, file_name)
+                added.append(root)
+            self.dirty = True
+        return added
+
+    def remove_tree(self, path: str) -> List[str]:
+        """Forget a directory and everything below it; returns the removed directories."""
+        parent, name = os.path.split(path)
+        prefix = path + os.sep
+        with self._lock:
+            record = self.dirs.get(parent)
+            if record is not None and name in record['dirs']:
+                record['dirs'].remove(name)
+                self._touch(parent)
+            removed = [root for root in self.dirs if root == path or root.startswith(prefix)]
+            for root in removed:
+                for file_name in self.dirs.pop(root)['files']:
+                    self._drop_name(root, file_name)
+            self.dirty = True
+        return removed
+
+    def save_if_dirty(self) -> None:
+        with self._lock:
+            if self.dirty:
+                self._save()
+
+    def _touch(self, root: str) -> None:
+        """Keep a directory's stored mtime in step with a change applied incrementally."""
+        try:
+            self.dirs[root]['mtime'] = os.stat(root).st_mtime_ns
+        except OSError:
+            pass
+        self.dirty = True
+
+    def _add_dir(self, root: str, dirs: List[str], files: List[str]) -> None:
+        try:
+            mtime = os.stat(root).st_mtime_ns
+        except OSError as e:
+            self._debug(f"Cannot stat {root} for index: {e}")
+            return
+        self.dirs[root] = {'mtime': mtime, 'files': list(files), 'dirs': list(dirs)}
+
+    def _rebuild_names(self) -> None:
+        by_name: Dict[str, List[str]] = {}
+        for root, record in self.dirs.items():
+            for name in record['files']:
+                by_name.setdefault(name, []).append(os.path.join(root, name))
+        self.by_name = by_name
+        self.by_key = None
+
+    def _add_name(self, root: str, name: str) -> None:
+        full_path = os.path.join(root, name)
+        self.by_name.setdefault(name, []).append(full_path)
+        if self.by_key is not None:
+            self.by_key.setdefault(name_key(name), []).append(full_path)
+
+    def _drop_name(self, root: str, name: str) -> None:
+        full_path = os.path.join(root, name)
+        tables = [(self.by_name, name)] if self.by_key is None else [(self.by_name, name), (self.by_key, name_key(name))]
+        for table, key in tables:
+            paths = table.get(key, [])
+            if full_path in paths:
+                paths.remove(full_path)
+            if not paths:
+                table.pop(key, None)
+
+    def _revalidate(self) -> None:
+        """Re-list directories whose mtime changed since the index was written."""
+        stale = []
+        identities = set()  # (st_dev, st_ino) of every indexed directory
+        for root, record in self.dirs.items():
+            try:
+                st = os.stat(root)
+            except OSError:
+                self._debug(f"Indexed directory vanished: {root}. Rebuilding index.")
+                self.rebuild()
+                return
+            identities.add((st.st_dev, st.st_ino))
+            if st.st_mtime_ns != record['mtime']:
+                stale.append((root, st.st_mtime_ns))
+
+        for root, mtime in stale:
+            listing = self.walker.list_dir(root)
+            if listing is None:
+                self.rebuild()
+                return
+            dirs, files = listing
+            # The walk leaves out sub-directories it already reached by another path
+            # (symlink cycles, several links to one folder); they are not news either
+            known = set(self.dirs[root]['dirs'])
+            dirs = [name for name in dirs if name in known or not self._indexed_elsewhere(root, name, identities)]
+            if set(dirs) != known:
+                self._debug(f"Sub-directories changed in {root}. Rebuilding index.")
+                self.rebuild()
+                return
+            self.dirs[root] = {'mtime': mtime, 'files': files, 'dirs': dirs}
+        self._rebuild_names()
+        if stale:
+            self._debug(f"Re-listed {len(stale)} changed directories in vault index")
+            self._save()
+
+    @staticmethod
+    def _indexed_elsewhere(root: str, name: str, identities: Set[Tuple[int, int]]) -> bool:
+        try:
+            st = os.stat(os.path.join(root, name))
+        except OSError:
+            return False
+        return (st.st_dev, st.st_ino) in identities
+
+    def _load(self) -> bool:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != self.VERSION or data.get('vault') != self.vault_path:
+            return False
+        if data.get('rules') != self.walker.rules_digest:
+            self._debug("Ignore rules changed since the vault index was written")
+            return False
+        self.dirs = data.get('dirs', {})
+        return bool(self.dirs)
+
+    def _save(self) -> None:
+        data = {'version': self.VERSION, 'vault': self.vault_path, 'rules': self.walker.rules_digest,
+                'dirs': self.dirs}
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+            self.dirty = False
+        except OSError as e:
+            self._debug(f"Could not save vault index to {self.cache_path}: {e}")
+
+
+class VaultWatcher:
+    """Keeps a VaultIndex current from inotify events (Linux only).
+
+    Every indexed directory gets a watch. inotify follows symlinks when adding
+    a watch, so a symlinked directory is watched through its target, and the
+    watch descriptor maps back to the index path(s) the vault walk produced
+    for it. Created, deleted and renamed entries are applied to the index as
+    deltas; a queue overflow or a new directory symlink (which may introduce a
+    cycle) falls back to revalidating the index. If a directory cannot be
+    watched (out of watches), the index stops counting as live and is
+    revalidated by mtime on every run instead.
+    """
+
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+    SAVE_INTERVAL = 30  # Seconds between saves of an incrementally updated index
+
+    def __init__(self, index: VaultIndex, debug: Callable[[str], None] = None):
+        self.index = index
+        self._debug = debug or (lambda msg: None)
+        self._fd = None
+        self._libc = None
+        self._paths_by_wd: Dict[int, Set[str]] = {}
+        self._wd_by_path: Dict[str, int] = {}
+        self._generation = -1
+        self._stop = threading.Event()
+        self._thread = None
+        self.events = 0
+        self.degraded = False  # A directory could not be watched; revalidate by mtime
+
+    def start(self) -> bool:
+        """Watch all indexed directories; False if inotify is not available."""
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            import ctypes
+            import ctypes.util
+            self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            self._debug(f"inotify not available: {e}")
+            return False
+        if self._fd < 0:
+            self._debug(f"inotify_init1 failed: errno {ctypes.get_errno()}")
+            return False
+
+        self.index.ensure_fresh()
+        if not self._sync_watches():
+            self.stop()
+            return False
+        # Catch changes made between building the index and adding the watches
+        self.index.begin_run()
+        self.index.ensure_fresh()
+        self._sync_watches()
+        self.index.live = not self.degraded
+
+        self._thread = threading.Thread(target=self._run, name='o2p-vault-watcher', daemon=True)
+        self._thread.start()
+        self._debug(f"Watching {len(self._wd_by_path)} vault directories with inotify")
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.index.live = False
+        if self._fd is not None and self._fd >= 0:
+            os.close(self._fd)
+        self._fd = None
+        self.index.save_if_dirty()
+
+    def _sync_watches(self) -> bool:
+        """Add watches for indexed directories that have none (after start or a rebuild)."""
+        self._generation = self.index.generation
+        with self.index._lock:
+            roots = [root for root in self.index.dirs if root not in self._wd_by_path]
+        for root in roots:
+            if not self._add_watch(root):
+                return False
+        return True
+
+    def _add_watch(self, root: str) -> bool:
+        import ctypes
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(root), self.WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            self._debug(f"inotify_add_watch failed for {root}: {os.strerror(errno)}")
+            if errno != 28:
+                return True  # Typically gone again already; its parent's events cover it
+            # ENOSPC: out of watches (fs.inotify.max_user_watches)
+            self._watch_failed(root)
+            return False
+        self._paths_by_wd.setdefault(wd, set()).add(root)
+        self._wd_by_path[root] = wd
+        return True
+
+    def _watch_failed(self, root: str) -> None:
+        """Changes below root go unseen: fall back to mtime revalidation of the index."""
+        if not self.degraded:
+            # Runs on the watcher thread: sys.stderr may be redirected into a --serve reply
+            print(f"WARNING: Cannot watch {root} (out of inotify watches, see fs.inotify.max_user_watches); "
+                  f"revalidating the vault index on every run instead.", file=sys.__stderr__)
+        self.degraded = True
+        self.index.live = False
+
+    def _forget(self, roots: List[str]) -> None:
+        for root in roots:
+            wd = self._wd_by_path.pop(root, None)
+            if wd is None:
+                continue
+            paths = self._paths_by_wd.get(wd, set())
+            paths.discard(root)
+            if not paths:
+                self._paths_by_wd.pop(wd, None)
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _run(self) -> None:
+        last_save = time.time()
+        while not self._stop.is_set():
+            try:
+                readable, _, _ = select.select([self._fd], [], [], 1.0)
+                if readable:
+                    self._handle(os.read(self._fd, 64 * 1024))
+                if self.index.generation != self._generation:
+                    self._sync_watches()
+                if self.index.dirty and time.time() - last_save > self.SAVE_INTERVAL:
+                    self.index.save_if_dirty()
+                    last_save = time.time()
+            except (OSError, ValueError) as e:
+                if self._stop.is_set():
+                    break
+                self._debug(f"Vault watcher error: {e}")
+                time.sleep(1)
+
+    def _handle(self, data: bytes) -> None:
+        offset = 0
+        while offset + 16 <= len(data):
+            wd, mask, _cookie, length = struct.unpack_from('iIII', data, offset)
+            name = os.fsdecode(data[offset + 16:offset + 16 + length].rstrip(b'\0'))
+            offset += 16 + length
+            self.events += 1
+
+            if mask & self.IN_Q_OVERFLOW:
+                self._debug("inotify queue overflow, revalidating vault index")
+                self.index.live = False
+                self.index.begin_run()
+                self.index.ensure_fresh()
+                self.index.live = not self.degraded
+                continue
+            if mask & self.IN_IGNORED:
+                for root in list(self._paths_by_wd.pop(wd, ())):
+                    self._wd_by_path.pop(root, None)
+                continue
+            if not name:
+                continue  # *_SELF events
+
+            for root in list(self._paths_by_wd.get(wd, ())):
+                self._apply(root, name, mask)
+
+    def _apply(self, root: str, name: str, mask: int) -> None:
+        path = os.path.join(root, name)
+        if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+            if self.index.walker.ignores(path, os.path.isdir(path)):
+                return  # Entries the vault walk skips (ignore rules)
+            if os.path.isdir(path):
+                if os.path.islink(path):
+                    # A directory symlink may close a cycle; let the walk's cycle detection decide
+                    self._debug(f"Directory symlink created: {path}, rebuilding vault index")
+                    self.index.rebuild()
+                    return
+                added = self.index.add_tree(path)
+                for new_root in added:
+                    if not self._add_watch(new_root):
+                        break  # Out of watches; the index is revalidated by mtime from now on
+                self._debug(f"Indexed new directory {path} ({len(added)} dirs)")
+            elif os.path.isfile(path):
+                self.index.add_file(root, name)
+                self._debug(f"Indexed new file {path}")
+        elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+            if path in self.index.dirs:
+                removed = self.index.remove_tree(path)
+                self._forget(removed)
+                self._debug(f"Removed directory {path} from index ({len(removed)} dirs)")
+            else:
+                self.index.remove_file(root, name)
+                self._debug(f"Removed file {path} from index")
+
+
+class LinkGraph:
+    """Vault-wide link graph, persisted in compact form and updated by file mtime.
+
+    Nodes are note paths interned as integer ids (one node per real file).
+    Outgoing links are array-backed adjacency lists in CSR form: the links of
+    node i are `targets[offsets[i]:offsets[i + 1]]`, ids of interned link
+    targets, with `labels` holding the interned heading or '^block' of each
+    link (0 = whole note), in document order. Only notes whose mtime or size
+    changed are re-parsed on update.
+
+    Link targets are resolved to nodes lazily with the collector's resolver.
+    Resolutions are persisted as well and stay valid while no note is added
+    or removed.
+    """
+
+    VERSION = 1
+    UNRESOLVED = -2  # Target not resolved yet; -1 = resolved to no note
+
+    def __init__(self, vault_path: str, list_notes: Callable[[], Iterable[str]],
+                 resolve: Callable[[str], Optional[str]], cache_dir: Optional[str] = None,
+                 debug: Callable[[str], None] = None, workers: int = 8):
+        self.vault_path = vault_path
+        self._list_notes = list_notes
+        self._resolve = resolve
+        self._debug = debug or (lambda msg: None)
+        self.workers = max(1, workers)
+        cache_dir = cache_dir or default_cache_dir(vault_path)
+        self.cache_path = os.path.join(cache_dir, 'link_graph.json')
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._ready = False
+        self._force_rebuild = False
+        self._unsaved = False  # Targets resolved since the graph was last saved
+        self._reset()
+        self.parsed = 0  # Notes parsed by the last update
+
+    def _reset(self) -> None:
+        self.paths: List[str] = []
+        self.stats = array('q')  # (st_dev, st_ino, mtime_ns, size) per node, flattened
+        self.offsets = array('i', [0])
+        self.targets = array('i')
+        self.labels = array('i')
+        self.target_names: List[str] = []
+        self.label_names: List[str] = ['']
+        self.resolved = array('i')  # Node id per target id
+        self._by_identity: Dict[Tuple[int, int], int] = {}
+        self._backlinks: Optional[Tuple[array, array]] = None
+
+    # Building
+
+    def load(self) -> None:
+        """Load the persisted graph once (an empty graph if there is none)."""
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                if not self._load():
+                    self._reset()
+
+    def begin_run(self, rebuild: bool = False) -> None:
+        """Make the next ensure_fresh() check the vault again (long-lived processes)."""
+        with self._lock:
+            self._ready = False
+            self._force_rebuild = rebuild
+
+    def ensure_fresh(self) -> None:
+        """Update the graph once per run."""
+        if self._ready:
+            return
+        with self._lock:
+            if not self._ready:
+                self.update(rebuild=self._force_rebuild)
+                self._ready = True
+                self._force_rebuild = False
+
+    def update(self, rebuild: bool = False) -> None:
+        """Bring the graph in line with the vault, parsing only new or changed notes."""
+        with self._lock:
+            if rebuild:
+                self._reset()
+                self._loaded = True
+            else:
+                self.load()
+            start_time = time.time()
+            paths = list(dict.fromkeys(self._list_notes()))
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                stats = list(pool.map(self._stat, paths))
+
+            # One node per real file; among alias paths the real file, then the shortest path wins
+            by_identity: Dict[Tuple[int, int], List[int]] = {}
+            for i, st in enumerate(stats):
+                if st is not None:
+                    by_identity.setdefault(st[:2], []).append(i)
+            node_indexes = sorted((min(found, key=lambda i: (os.path.islink(paths[i]), len(paths[i].split(os.sep)), paths[i]))
+                                   if len(found) > 1 else found[0]) for found in by_identity.values())
+            node_indexes.sort(key=lambda i: paths[i])
+
+            links: List[Optional[List[Tuple[str, str]]]] = []
+            to_parse = []
+            for i in node_indexes:
+                old = self._by_identity.get(stats[i][:2])
+                if old is not None and tuple(self.stats[old * 4:old * 4 + 4]) == stats[i]:
+                    links.append(self._raw_links(old))
+                else:
+                    links.append(None)
+                    to_parse.append(len(links) - 1)
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for position, parsed in zip(to_parse, pool.map(self._parse, [paths[node_indexes[p]] for p in to_parse])):
+                    links[position] = parsed
+
+            new_paths = [paths[i] for i in node_indexes]
+            same_notes = set(new_paths) == set(self.paths)
+            old_resolved = {name: self.resolved[tid] for tid, name in enumerate(self.target_names)} if same_notes else {}
+            changed = bool(to_parse) or not same_notes
+
+            self._reset()
+            self.paths = new_paths
+            target_ids: Dict[str, int] = {}
+            label_ids: Dict[str, int] = {'': 0}
+            for node, i in enumerate(node_indexes):
+                self.stats.extend(stats[i])
+                self._by_identity[stats[i][:2]] = node
+                for target, label in links[node]:
+                    self.targets.append(target_ids.setdefault(target, len(target_ids)))
+                    self.labels.append(label_ids.setdefault(label, len(label_ids)))
+                self.offsets.append(len(self.targets))
+            self.target_names = list(target_ids)
+            self.label_names = list(label_ids)
+            self.resolved = array('i', (old_resolved.get(name, self.UNRESOLVED) for name in self.target_names))
+            self.parsed = len(to_parse)
+            self._debug(f"Link graph: {len(self.paths)} notes, {len(self.targets)} links, "
+                        f"{self.parsed} parsed ({time.time() - start_time:.2f}s)")
+            if changed:
+                self._save()
+
+    def _stat(self, path: str) -> Optional[Tuple[int, int, int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _parse(self, path: str) -> List[Tuple[str, str]]:
+        # Read directly: keeping every note of the vault in the NoteCache would cost its size in memory
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeError) as e:
+            self._debug(f"Link graph cannot read {path}: {e}")
+            return []
+        return [(link.target, link.section or '') for link in scan_wikilinks(content) if link.kind == 'note']
+
+    def _raw_links(self, node: int) -> List[Tuple[str, str]]:
+        start, end = self.offsets[node], self.offsets[node + 1]
+        return [(self.target_names[self.targets[k]], self.label_names[self.labels[k]]) for k in range(start, end)]
+
+    # Queries
+
+    def node(self, path: str) -> Optional[int]:
+        """Node id of the real file behind `path`, or None if it is not in the graph."""
+        st = self._stat(path)
+        return self._by_identity.get(st[:2]) if st else None
+
+    def links(self, note: CachedNote) -> Optional[List[Tuple[str, Optional[str]]]]:
+        """(target, heading) links of a note, or None if the note changed since it was parsed."""
+        node = self._by_identity.get(note.identity)
+        if node is None or tuple(self.stats[node * 4 + 2:node * 4 + 4]) != (note.mtime_ns, note.size):
+            return None
+        return [(target, label or None) for target, label in self._raw_links(node)]
+
+    def edges(self, node: int) -> Iterable[Tuple[int, Optional[str]]]:
+        """Resolved (target node, heading) links of a node; unresolvable links are skipped."""
+        for k in range(self.offsets[node], self.offsets[node + 1]):
+            target = self._target_node(self.targets[k])
+            if target >= 0:
+                yield target, self.label_names[self.labels[k]] or None
+
+    def _target_node(self, target_id: int) -> int:
+        node = self.resolved[target_id]
+        if node == self.UNRESOLVED:
+            path = self._resolve(self.target_names[target_id])
+            found = self.node(path) if path else None
+            node = self.resolved[target_id] = found if found is not None else -1
+            self._unsaved = True
+        return node
+
+    def closure(self, start: int, max_depth: int) -> Dict[Tuple[int, Optional[str]], int]:
+        """(node, heading) -> depth of everything reachable within `max_depth` links.
+
+        Follows the collector's rules: a general link to a note covers the
+        whole note, so its heading links are not followed separately.
+        """
+        reached = {(start, None): 0}
+        level = [start]
+        for depth in range(1, max_depth + 1):
+            next_level = []
+            for node in dict.fromkeys(level):
+                groups: Dict[int, List[Optional[str]]] = {}
+                for target, heading in self.edges(node):
+                    groups.setdefault(target, []).append(heading)
+                for target, headings in groups.items():
+                    for heading in ([None] if None in headings else dict.fromkeys(headings)):
+                        if (target, heading) not in reached:
+                            reached[(target, heading)] = depth
+                            next_level.append(target)
+            if not next_level:
+                break
+            level = next_level
+        self.save_resolutions()
+        return reached
+
+    def backlinks(self, node: int) -> List[int]:
+        """Nodes linking to `node`."""
+        offsets, sources = self._reverse()
+        return list(sources[offsets[node]:offsets[node + 1]])
+
+    def orphans(self) -> List[int]:
+        """Nodes without resolved links to or from another note (links to themselves do not count)."""
+        offsets, _ = self._reverse()
+        return [node for node in range(len(self.paths))
+                if offsets[node] == offsets[node + 1] and all(target == node for target, _ in self.edges(node))]
+
+    def _reverse(self) -> Tuple[array, array]:
+        """Backlink adjacency in CSR form (unique sources per node), built on first use."""
+        with self._lock:
+            if self._backlinks is None:
+                incoming: List[Set[int]] = [set() for _ in self.paths]
+                for node in range(len(self.paths)):
+                    for target, _ in self.edges(node):
+                        if target != node:
+                            incoming[target].add(node)
+                offsets = array('i', [0])
+                sources = array('i')
+                for node_sources in incoming:
+                    sources.extend(sorted(node_sources))
+                    offsets.append(len(sources))
+                self._backlinks = (offsets, sources)
+                self.save_resolutions()
+            return self._backlinks
+
+    # Persistence
+
+    def save_resolutions(self) -> None:
+        """Persist link targets resolved by queries since the last save."""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def _load(self) -> bool:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if (data.get('version') != self.VERSION or data.get('vault') != self.vault_path
+                or data.get('byteorder') != sys.byteorder):
+            return False
+        try:
+            self.paths = data['paths']
+            self.target_names = data['target_names']
+            self.label_names = data['label_names']
+            for name, typecode in (('stats', 'q'), ('offsets', 'i'), ('targets', 'i'), ('labels', 'i'), ('resolved', 'i')):
+                values = array(typecode)
+                values.frombytes(base64.b64decode(data[name]))
+                setattr(self, name, values)
+        except (KeyError, TypeError, ValueError) as e:
+            self._debug(f"Ignoring damaged link graph cache {self.cache_path}: {e}")
+            return False
+        self._by_identity = {(self.stats[node * 4], self.stats[node * 4 + 1]): node for node in range(len(self.paths))}
+        self._backlinks = None
+        return True
+
+    def _save(self) -> None:
+        data = {'version': self.VERSION, 'vault': self.vault_path, 'byteorder': sys.byteorder,
+                'paths': self.paths, 'target_names': self.target_names, 'label_names': self.label_names}
+        for name in ('stats', 'offsets', 'targets', 'labels', 'resolved'):
+            data[name] = base64.b64encode(getattr(self, name).tobytes()).decode('ascii')
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+            self._unsaved = False
+        except OSError as e:
+            self._debug(f"Could not save link graph to {self.cache_path}: {e}")
+
+
+class PhaseProfiler:
+    """Wall time and call counts per phase, plus per-link resolution timings (--profile-json).
+
+    A disabled profiler hands out a shared null context, so instrumented code
+    costs next to nothing. Phases may nest (resolution includes loading the
+    index) and threads add up, so phase times can exceed the wall time.
+    """
+
+    VERSION = 1
+    _NULL = contextlib.nullcontext()
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.phases: Dict[str, List[float]] = {}  # name -> [seconds, calls]
+        self.links: List[Tuple[str, str, float, Optional[str]]] = []  # (target, strategy, seconds, path)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def phase(self, name: str):
+        """Context manager timing one call of a phase."""
+        return self._timed(name) if self.enabled else self._NULL
+
+    @contextlib.contextmanager
+    def _timed(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            with self._lock:
+                totals = self.phases.setdefault(name, [0.0, 0])
+                totals[0] += elapsed
+                totals[1] += 1
+
+    def link(self, target: str, strategy: str, seconds: float, path: Optional[str]) -> None:
+        with self._lock:
+            self.links.append((target, strategy, seconds, path))
+
+    def report(self, top: int = 20, **context) -> dict:
+        """Machine-readable report; keys are sorted so reports diff cleanly."""
+        strategies: Dict[str, dict] = {}
+        for _, strategy, seconds, _ in self.links:
+            totals = strategies.setdefault(strategy, {'count': 0, 'seconds': 0.0})
+            totals['count'] += 1
+            totals['seconds'] += seconds
+        slowest = sorted(self.links, key=lambda link: (-link[2], link[0]))[:top]
+        return {
+            'version': self.VERSION,
+            **context,
+            'wall_seconds': round(time.perf_counter() - self._start, 6),
+            'phases': {name: {'seconds': round(seconds, 6), 'calls': calls}
+                       for name, (seconds, calls) in sorted(self.phases.items())},
+            'resolution': {strategy: {'count': totals['count'], 'seconds': round(totals['seconds'], 6)}
+                           for strategy, totals in sorted(strategies.items())},
+            'slowest_links': [{'target': target, 'strategy': strategy, 'seconds': round(seconds, 6), 'path': path}
+                              for target, strategy, seconds, path in slowest],
+        }
+
+
+class ObsidianLinkCollector:
+    def __init__(self, vault_path: str = None, max_depth: int = 1, debug: bool = False,
+                 use_index: bool = True, rebuild_index: bool = False, workers: int = 1,
+                 encoding: str = TokenCounter.DEFAULT_ENCODING,
+                 max_tokens: Optional[int] = None, max_files: Optional[int] = None,
+                 index: Optional[VaultIndex] = None, note_cache: Optional[NoteCache] = None,
+                 token_counter: Optional[TokenCounter] = None, use_graph: bool = False,
+                 graph: Optional[LinkGraph] = None, profile: str = 'raw',
+                 cache_aggregates: bool = False, profile_phases: bool = False):
+        """Initialize the collector with vault path and options.
+
+        `index`, `note_cache`, `token_counter` and `graph` let a long-lived process
+        (see serve()) share warm lookup state between collectors on the same vault.
+        With `use_graph`, links of unchanged notes come from the cached LinkGraph
+        instead of being scanned again. With `cache_aggregates`, a manifest of
+        each aggregate is kept (see AggregateCache) and reused by the next run.
+        `profile_phases` times each phase and link resolution (see PhaseProfiler).
+        """
+        if vault_path is None:
+            # Default to ./references/obsidian
+            vault_path = os.path.join(os.getcwd(), 'references', 'obsidian')
+            os.makedirs(vault_path, exist_ok=True)
+            
+        self.vault_path = os.path.abspath(vault_path)
+        self.max_depth = max_depth
+        self.debug_enabled = debug
+        self.profiler = PhaseProfiler(profile_phases)
+        self.visited_files: Set[Tuple[int, int, str]] = set()  # (st_dev, st_ino, heading)
+        self._aliases: Dict[Tuple[int, int, str], List[str]] = {}  # Visited key -> later paths to it
+        self._identities: Dict[str, Optional[Tuple[int, int]]] = {}  # Path -> (st_dev, st_ino)
+        self.collected_files: List[CollectedNote] = []
+        self.start_file = None  # Store start file name
+        # 1 = depth-first recursion, >1 = level-by-level expansion on a thread pool. A note is
+        # expanded at the depth it is first reached: depth-first that depends on link order,
+        # breadth-first it is the shortest distance, so the two can collect different notes
+        self.workers = max(1, workers)
+        # Optional budgets; collection then runs breadth-first and stops once one is reached
+        self.max_tokens = max_tokens
+        self.max_files = max_files
+        self.collected_tokens = 0
+        # [(vault-relative path#heading, or the raw target if never resolved, depth, reason, resolved)]
+        self.pruned_links: List[Tuple[str, int, str, bool]] = []
+        self._over_budget: List[str] = []  # Notes read but not collected: their size decided the pruning
+        # Link target -> resolved path (None if unresolvable), links are parsed by scan_wikilinks()
+        self.resolved_links: Dict[str, Optional[str]] = {}
+        # Each real file is read once per run; sections are slices of its heading table
+        self.note_cache = note_cache or NoteCache()
+        self.note_cache.begin_run()
+        self._note_reads_at_start = self.note_cache.reads  # Shared caches keep counting across runs
+        self.token_counter = token_counter or TokenCounter(encoding, default_cache_dir(self.vault_path), debug=self._debug)
+        self._token_hits_at_start = self.token_counter.hits
+        self._token_misses_at_start = self.token_counter.misses
+        # Transformations shrinking each collected section (see RenderProfile)
+        self.profile = RenderProfile(profile, self._count_tokens_many)
+        # Set while streaming: sections go straight to disk and records drop their content
+        self.writer: Optional[StreamingAggregateWriter] = None
+        # Directory walks (index builds and the recursive search) and their syscall counters
+        self.walker = VaultWalker(debug=self._debug, ignore=IgnoreRules.load(self.vault_path), root=self.vault_path)
+        # Basename index replacing the recursive vault search (None = walk every time)
+        self.index = None
+        if use_index and index is not None:
+            self.index = index
+            self.index.begin_run(rebuild=rebuild_index)
+        elif use_index:
+            self.index = VaultIndex(self.vault_path, self.walker, debug=self._debug, rebuild=rebuild_index)
+        # Manifests of previous aggregates; needs the index to tell whether link resolutions changed
+        self.aggregate_cache = AggregateCache(default_cache_dir(self.vault_path), self._debug) \
+            if cache_aggregates and self.index is not None else None
+        self.cache_status = 'off'  # 'hit' (output reused), 'partial' (link resolutions reused) or 'miss'
+        self.cache_changed = 0  # Notes of the manifest that changed since it was stored
+        self._cached_stats: Optional[dict] = None
+        # Vault-wide link graph, brought up to date once per run (see link_graph())
+        self.use_graph = use_graph
+        self.graph = graph
+        if self.graph is None and use_graph:
+            self.graph = self._new_graph()
+        if self.graph is not None:
+            self.graph.begin_run()
+        
+    def _debug(self, msg: str):
+        if self.debug_enabled:
+            print(f"DEBUG: {msg}")
+
+    def process(self, start_path: str) -> str:
+        """Process the Obsidian vault starting from a specific file."""
+        self.start_file = start_path
+        with self.profiler.phase('cache'):
+            cached = self._reuse_cached_aggregate('text')
+        if cached is not None:
+            return cached
+        normalized_path = self._resolve_link(start_path)
+        
+        if not normalized_path:
+            self._debug(f"Could not find file: {start_path}")
+            return f"File not found: {start_path}"
+            
+        self._debug(f"Starting from normalized file: {normalized_path}")
+        
+        # Process the start file
+        self._expand(normalized_path)
+        
+        with self.profiler.phase('render'):
+            result = self._generate_output()
+        with self.profiler.phase('cache'):
+            self._store_aggregate('text', result)
+        return result
+
+    def stream(self, start_path: str, output_path: str, structure_path: Optional[str] = None) -> None:
+        """Process the vault writing the aggregate to `output_path` as files are collected."""
+        self.start_file = start_path
+        if structure_path is None:  # Aggregates with a sidecar structure file are not cached
+            with self.profiler.phase('cache'):
+                cached = self._reuse_cached_aggregate('stream', output_path)
+            if cached is not None:
+                return
+        self.writer = StreamingAggregateWriter(output_path, structure_path, self._count_tokens)
+        try:
+            normalized_path = self._resolve_link(start_path)
+            if not normalized_path:
+                self._debug(f"Could not find file: {start_path}")
+                self.writer.write(f"File not found: {start_path}")
+                return
+
+            self._debug(f"Starting from normalized file: {normalized_path}")
+            self.writer.write("\n".join(self._header_lines()) + "\n\n")
+            self.writer.write("## Content\n\n")
+
+            self._expand(normalized_path)
+
+            if len(self.collected_files) > 1:
+                # Built from the records at the end, when all alias paths are known
+                self.writer.write_structure(self._generate_tree_structure())
+            if self.pruned_links:
+                self.writer.write("\n".join(self._pruned_lines()) + "\n")
+            self.writer.write("\n".join(self._statistics_lines(self.get_statistics())))
+        finally:
+            self.writer.close()
+        if structure_path is None and self.aggregate_cache is not None:
+            with self.profiler.phase('cache'):
+                self._store_aggregate('stream', output_file=output_path)
+
+    def profile_report(self, top: int = 20) -> dict:
+        """--profile-json report of this run: phases, link resolution and I/O counters."""
+        return self.profiler.report(
+            top,
+            start=self.start_file,
+            vault=self.vault_path,
+            depth=self.max_depth,
+            workers=self.workers,
+            render_profile=self.profile.name,
+            aggregate_cache=self.cache_status,
+            files=len(self.collected_files),
+            note_reads=self.note_cache.reads - self._note_reads_at_start,
+            walker=dict(self.walker.counters),
+            token_cache={'hits': self.token_counter.hits - self._token_hits_at_start,
+                         'misses': self.token_counter.misses - self._token_misses_at_start},
+        )
+
+    def _aggregate_params(self, output_format: str) -> dict:
+        """Everything besides the notes themselves that shapes an aggregate."""
+        return {'vault': self.vault_path, 'start': self.start_file, 'depth': self.max_depth,
+                'profile': self.profile.name, 'max_tokens': self.max_tokens, 'max_files': self.max_files,
+                'order': 'breadth' if self.workers > 1 or self._budgeted else 'depth',
+                'tokens': self.token_counter.method, 'format': output_format}
+
+    def _reuse_cached_aggregate(self, output_format: str, output_path: Optional[str] = None) -> Optional[str]:
+        """Return the stored output if nothing in the closure changed, else reuse the link resolutions.
+
+        With `output_path` (streaming), the stored output is copied there and '' is returned on a hit.
+        """
+        if self.aggregate_cache is None:
+            return None
+        key = self.aggregate_cache.key(self._aggregate_params(output_format))
+        manifest = self.aggregate_cache.load(key)
+        if manifest is None:
+            self.cache_status = 'miss'
+            return None
+        unchanged, changed = self.aggregate_cache.unchanged_notes(manifest)
+
+        # Link resolutions hold while no indexed directory changed; otherwise probe them again (stat only)
+        self.index.ensure_fresh()
+        resolved = manifest['resolved']
+        if manifest['index_signature'] != self.index.signature():
+            moved = [target for target, path in resolved.items() if self._normalize_filename(target, warn=False) != path]
+            if moved:
+                self._debug(f"Aggregate cache: link targets resolve differently now: {moved}")
+                resolved = None
+
+        if not changed and resolved is not None:
+            if output_path is not None:
+                output = '' if self.aggregate_cache.copy_output(key, manifest, output_path) else None
+            else:
+                output = self.aggregate_cache.output(key, manifest)
+            if output is not None:
+                self.collected_files = [CollectedNote(path, heading, None, depth, aliases)
+                                        for path, heading, depth, aliases in manifest['records']]
+                self.pruned_links = [tuple(pruned) for pruned in manifest['pruned']]
+                self._cached_stats = manifest['stats']
+                self.cache_status = 'hit'
+                self._debug("Aggregate cache: nothing changed, reusing the stored output")
+                return output
+
+        # Re-collect; notes are read again, link targets that still resolve the same are not
+        self.resolved_links.update(resolved or {})
+        self.cache_status = 'partial'
+        self.cache_changed = changed
+        self._debug(f"Aggregate cache: {changed} notes changed, {unchanged} unchanged")
+        return None
+
+    def _store_aggregate(self, output_format: str, output: Optional[str] = None,
+                         output_file: Optional[str] = None) -> None:
+        """Write the manifest of the aggregate just produced (given as text or as the streamed file)."""
+        if self.aggregate_cache is None or not self.collected_files:
+            return
+        notes = {}
+        # A note that did not fit the budget may fit once it shrinks, so it is part of the closure too
+        for path in [record.path for record in self.collected_files] + self._over_budget:
+            note = self.note_cache.peek(path)
+            if note is not None and note.identity is not None:
+                notes[path] = [*note.identity, note.mtime_ns, note.size]
+        manifest = {
+            'params': self._aggregate_params(output_format),
+            'index_signature': self.index.signature(),
+            'resolved': self.resolved_links,
+            'notes': notes,
+            'records': [[record.path, record.heading, record.depth, record.aliases] for record in self.collected_files],
+            'pruned': self.pruned_links,
+            'stats': self.get_statistics(),
+        }
+        self.aggregate_cache.store(self.aggregate_cache.key(manifest['params']), manifest, output, output_file)
+
+    def _expand(self, normalized_path: str) -> None:
+        """Collect the start file and follow its links up to max_depth."""
+        if self.use_graph:
+            self.link_graph()
+        if self.workers > 1 or self._budgeted:
+            self._process_breadth_first(normalized_path)
+        else:
+            self._process_file(normalized_path, 0)
+
+    def _process_file(self, filename: str, current_depth: int = 0, specific_heading: Optional[str] = None) -> None:
+        """Process a file and extract its content and links."""
+        self._debug(f"Processing file: {filename} at depth {current_depth}")
+        if not self._claim(filename, self._identity(filename), specific_heading):
+            return
+
+        note = self._read_file(filename)
+        if note is None:
+            return
+        self._collect(filename, note, specific_heading, current_depth)
+
+        # If we've reached the maximum depth, don't process links
+        if current_depth >= self.max_depth:
+            self._debug(f"Reached max depth ({self.max_depth}), not following links in {filename}")
+            return
+
+        # Process each target file exactly once, prioritizing general links
+        for link_target, headings in self._link_groups(note).items():
+            normalized_path = self._resolve_link(link_target)
+            if not normalized_path:
+                self._debug(f"Could not normalize link target: {link_target}")
+                continue
+                
+            self._debug(f"Link target '{link_target}' normalized to: {normalized_path}")
+            for heading in headings:
+                self._process_file(normalized_path, current_depth + 1, specific_heading=heading)
+
+    @property
+    def _budgeted(self) -> bool:
+        return self.max_tokens is not None or self.max_files is not None
+
+    def _process_breadth_first(self, start_path: str) -> None:
+        """Expand links level by level, reading files and resolving links of a level concurrently.
+
+        Collection order is deterministic: a level keeps the order in which its
+        links appear in the (already ordered) previous level, and visited keys are
+        claimed on the main thread in that order before any I/O happens.
+
+        This is not the depth-first note set. Depth-first claims a note at the
+        depth of the first path that reaches it, even when a shorter path comes
+        later, so with max_depth its links may not be followed; here every note
+        is claimed at its shortest distance from the start. The aggregate cache
+        keys on the expansion order for this reason.
+
+        With a token or file budget, each level is ordered by link priority (how
+        many notes of the previous level link to the target, then first
+        appearance) and read in small batches, so expansion stops as soon as the
+        budget is reached without reading the notes that would be discarded.
+        """
+        level: List[Tuple[str, Optional[str]]] = [(start_path, None)]
+        current_depth = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while level:
+                self._debug(f"Expanding level {current_depth}: {len(level)} links")
+                # stat() in parallel, then claim in level order on this thread
+                identities = list(pool.map(self._identity, [path for path, _ in level]))
+                claimed = [(path, heading) for (path, heading), identity in zip(level, identities)
+                           if self._claim(path, identity, heading)]
+                batch_size = self.workers * 2 if self._budgeted else max(1, len(claimed))
+
+                pending: List[Tuple[str, List[Optional[str]]]] = []
+                budget_reached = False
+                for offset in range(0, len(claimed), batch_size):
+                    batch = claimed[offset:offset + batch_size]
+                    notes = list(pool.map(self._read_file, [path for path, _ in batch]))
+                    for index, ((path, heading), note) in enumerate(zip(batch, notes)):
+                        if note is None:
+                            continue
+                        content = self._render_content(path, note, heading)
+                        reason, tokens = self._budget_exceeded(content)
+                        if reason:
+                            self._debug(f"Budget reached ({reason}) at {path}, pruning remaining links")
+                            self._over_budget.append(path)
+                            for pruned_path, pruned_heading in claimed[offset + index:]:
+                                self._prune(self._display_link(pruned_path, pruned_heading), current_depth, reason)
+                            budget_reached = True
+                            break
+                        self._collect(path, note, heading, current_depth, content, tokens)
+                        if current_depth < self.max_depth:
+                            pending.extend(self._link_groups(note).items())
+                        else:
+                            self._debug(f"Reached max depth ({self.max_depth}), not following links in {path}")
+                    if budget_reached:
+                        break
+
+                if budget_reached:
+                    # Links found in collected notes are not resolved or read any more;
+                    # only targets already resolved earlier can be recognized as visited
+                    for link_target, headings in pending:
+                        known_path = self.resolved_links.get(link_target)
+                        known_identity = self._identity(known_path) if known_path else None
+                        for heading in headings:
+                            if known_identity and (*known_identity, heading or '') in self.visited_files:
+                                continue
+                            if known_path:
+                                self._prune(self._display_link(known_path, heading), current_depth + 1, 'budget reached')
+                            else:
+                                link = f"{link_target}#{heading}" if heading else link_target
+                                self._prune(link, current_depth + 1, 'budget reached', resolved=False)
+                    break
+
+                targets = list(dict.fromkeys(target for target, _ in pending))
+                resolved = dict(zip(targets, pool.map(self._resolve_link, targets)))
+                level = []
+                for link_target, headings in pending:
+                    normalized_path = resolved[link_target]
+                    if not normalized_path:
+                        self._debug(f"Could not normalize link target: {link_target}")
+                        continue
+                    level.extend((normalized_path, heading) for heading in headings)
+                if self._budgeted:
+                    level = self._prioritize(level)
+                current_depth += 1
+
+    def _prioritize(self, level: List[Tuple[str, Optional[str]]]) -> List[Tuple[str, Optional[str]]]:
+        """Order a level by how often it is linked (descending), then by first appearance."""
+        link_counts: Dict[Tuple[str, Optional[str]], int] = {}
+        for item in level:
+            link_counts[item] = link_counts.get(item, 0) + 1
+        # dicts keep first-appearance order and sorted() is stable
+        return sorted(link_counts, key=lambda item: -link_counts[item])
+
+    def _budget_exceeded(self, content: str) -> Tuple[Optional[str], Optional[int]]:
+        """The budget that collecting `content` would exceed (if any), and its token count if it was counted."""
+        if self.max_files is not None and self.collected_files and len(self.collected_files) >= self.max_files:
+            return 'max-files', None
+        if self.max_tokens is None:
+            return None, None
+        tokens = self._count_tokens(content)
+        if self.collected_files and self.collected_tokens + tokens > self.max_tokens:
+            return 'max-tokens', tokens
+        return None, tokens  # The start file is always collected
+
+    def _prune(self, link: str, depth: int, reason: str, resolved: bool = True) -> None:
+        self.pruned_links.append((link, depth, reason, resolved))
+
+    def _display_link(self, path: str, heading: Optional[str]) -> str:
+        try:
+            link = os.path.relpath(path, self.vault_path)
+        except ValueError:
+            link = path
+        return f"{link}#{heading}" if heading else link
+
+    def _identity(self, filename: str) -> Optional[Tuple[int, int]]:
+        """(st_dev, st_ino) of the real file behind a path, following symlinks; None if missing."""
+        if filename not in self._identities:
+            try:
+                st = os.stat(filename)
+                self._identities[filename] = (st.st_dev, st.st_ino)
+            except OSError as e:
+                self._debug(f"File does not exist or symlink is broken: {filename} ({e})")
+                self._identities[filename] = None
+        return self._identities[filename]
 
-class ObsidianLinkCollector:
-    def __init__(self, vault_path: str = None, max_depth: int = 1, debug: bool = False):
-        """Initialize the collector with vault path and options."""
-        if vault_path is None:
-            # Default to ./references/obsidian
-            vault_path = os.path.join(os.getcwd(), 'references', 'obsidian')
-            os.makedirs(vault_path, exist_ok=True)
-            
-        self.vault_path = os.path.abspath(vault_path)
-        self.max_depth = max_depth
-        self.debug_enabled = debug
-        self.visited_files = set()
-        self.collected_files: List[Tuple[str, str]] = []  # [(file_path, content)]
-        self.start_file = None  # Store start file name
-        # Initialize try_variants as an empty list
-        self.try_variants = []
-        # Updated pattern to properly handle links with pipe symbol AND heading links
-        self.link_pattern = re.compile(r'(?:\[\[|\!)?\[\[(.*?)(?:#(.*?))?\]\](?:\]\])?')
-        self.file_content_map = {}  # Track file content by file path
-        
-    def _debug(self, msg: str):
-        if self.debug_enabled:
-            print(f"DEBUG: {msg}")
+    def _claim(self, filename: str, identity: Optional[Tuple[int, int]], specific_heading: Optional[str]) -> bool:
+        """Mark a real file+heading combination as visited; False if it was already processed.
 
-    def process(self, start_path: str) -> str:
-        """Process the Obsidian vault starting from a specific file."""
-        self.start_file = start_path
-        normalized_path = self._normalize_filename(start_path)
-        
-        if not normalized_path:
-            self._debug(f"Could not find file: {start_path}")
-            return f"File not found: {start_path}"
-            
-        self._debug(f"Starting from normalized file: {normalized_path}")
-        
-        # Process the start file
-        self._process_file(normalized_path, 0)
-        
-        return self._generate_output()
+        A file reached again through another path (symlinked folder, alias
+        symlink, different relative path) is recorded as an alias of the first.
+        """
+        if identity is None:
+            return False
+        file_heading_key = (*identity, specific_heading or '')
+        if file_heading_key in self.visited_files:
+            aliases = self._aliases.setdefault(file_heading_key, [filename])
+            if filename not in aliases:
+                self._debug(f"Recording alias path for already processed file: {filename}")
+                aliases.append(filename)
+            else:
+                self._debug(f"Skipping already processed file+heading: {filename}#{specific_heading or ''}")
+            return False
+        self.visited_files.add(file_heading_key)
+        # The first path is the canonical one; later paths are appended as aliases
+        self._aliases[file_heading_key] = [filename]
+        return True
 
-    def _process_file(self, filename: str, current_depth: int = 0, specific_heading: Optional[str] = None) -> None:
-        """Process a file and extract its content and links."""
-        self._debug(f"Processing file: {filename} at depth {current_depth}")
-        # Log if file is a symlink
-        is_symlink = False
-        link_target = None
+    def _read_file(self, filename: str) -> Optional[CachedNote]:
+        """Read a note (following symlinks); None if it is missing or unreadable."""
         try:
             if os.path.islink(filename):
-                is_symlink = True
-                link_target = os.readlink(filename)
-                self._debug(f"File is a symlink: {filename} -> {link_target}")
+                self._debug(f"File is a symlink: {filename} -> {os.readlink(filename)}")
         except Exception as e:
             self._debug(f"Error reading symlink status/target for {filename}: {e}")
 
-        # Check if we've already processed this exact file+heading combination
-        file_heading_key = f"{filename}#{specific_heading or ''}"
-        if file_heading_key in self.visited_files:
-            self._debug(f"Skipping already processed file+heading: {file_heading_key}")
-            return
-
-        # Add to visited files to prevent duplicates
-        self.visited_files.add(file_heading_key)
-
         # Check if file exists (os.path.exists resolves symlinks)
         if not os.path.exists(filename):
             self._debug(f"File does not exist or symlink is broken: {filename}")
-            return
+            return None
 
-        # Read the file content (open resolves symlinks)
+        # Read the file content (open resolves symlinks), once per run
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                full_content = f.read()
+            with self.profiler.phase('read'):
+                return self.note_cache.get(filename)
         except Exception as e:
             self._debug(f"Error reading file {filename}: {str(e)}")
-            return
+            return None
 
-        # Determine the content to add (full file or specific section)
-        content_to_add = full_content # Default to full content
+    def _collect(self, filename: str, note: CachedNote, specific_heading: Optional[str], depth: int,
+                 content_to_add: Optional[str] = None, tokens: Optional[int] = None) -> None:
+        """Add the full file or the requested section to the collected files (`tokens` if already counted)."""
+        if content_to_add is None:
+            content_to_add = self._render_content(filename, note, specific_heading)
+        self.profile.commit()
+
+        # Add to collected files; alias paths found later show up through the shared list
+        aliases = self._aliases.get((*note.identity, specific_heading or ''), [filename])
+        record = CollectedNote(filename, specific_heading, content_to_add, depth, aliases)
+        if self._budgeted and tokens is None:
+            tokens = self._count_tokens(content_to_add)
+        if self.writer is not None:
+            with self.profiler.phase('render'):
+                _, section = self._render_entry(record)
+                self.writer.write_entry(section, content_to_add, tokens)
+            record.content = None
+        self.collected_files.append(record)
+        if self._budgeted:
+            self.collected_tokens += tokens
+        self._debug(f"Collected content from: {filename} (Heading: {specific_heading or 'None'})")
+
+    def _render_content(self, filename: str, note: CachedNote, specific_heading: Optional[str]) -> str:
+        """The section to emit, after the render profile's transformations."""
+        with self.profiler.phase('extract'):
+            content = self._section_content(note, specific_heading)
+        if not self.profile.steps:
+            return content
+        with self.profiler.phase('render'):
+            return self.profile.apply(content, self._relative_path(filename))
+
+    def _count_tokens(self, text: str) -> int:
+        with self.profiler.phase('tokens'):
+            return self.token_counter.count(text)
+
+    def _count_tokens_many(self, texts: List[str]) -> List[int]:
+        with self.profiler.phase('tokens'):
+            return self.token_counter.count_many(texts)
+
+    def _section_content(self, note: CachedNote, specific_heading: Optional[str]) -> str:
+        """The full file, or the requested section if it can be found."""
+        content_to_add = note.content # Default to full content
 
         # If a specific heading is requested, extract that section
         if specific_heading:
-            self._debug(f"Looking for heading '{specific_heading}' in {filename}")
-            extracted_section = self._extract_section(full_content, specific_heading)
+            self._debug(f"Looking for heading '{specific_heading}' in {note.path}")
+            if specific_heading.startswith('^'):
+                extracted_section = note.block(specific_heading[1:])
+            else:
+                extracted_section = note.section(specific_heading)
             if extracted_section:
                 content_to_add = extracted_section
                 self._debug(f"Extracted section under heading '{specific_heading}'")
             else:
                 self._debug(f"Heading '{specific_heading}' not found. Adding full file content instead.")
+        return content_to_add
+
+    def _link_groups(self, note: CachedNote) -> Dict[str, List[Optional[str]]]:
+        """Group a note's links by target: [None] for a general link, else the unique headings."""
+        with self.profiler.phase('links'):
+            links = self.graph.links(note) if self.use_graph and self.graph is not None else None
+            if links is None:
+                links = []
+                for link in note.links:
+                    # Attachments and self-links never resolve to a note
+                    if link.kind != 'note':
+                        self._debug(f"Skipping {link.kind} link: {link.target or '#' + (link.section or '')}")
+                        continue
+                    links.append((link.target, link.section))
+            self._debug(f"Found {len(links)} note links in {note.path}")
 
-        # Store file to content mapping
-        self.file_content_map[file_heading_key] = content_to_add
+            link_groups: Dict[str, List[Optional[str]]] = {}
+            for link_target, section in links:
+                link_groups.setdefault(link_target, []).append(section)
 
-        # Add to collected files
-        self.collected_files.append((filename, content_to_add))
-        self._debug(f"Collected content from: {filename} (Heading: {specific_heading or 'None'})")
+            for link_target, headings in link_groups.items():
+                if None in headings:
+                    # A general link covers the whole file, skip all heading-specific links
+                    self._debug(f"Found general link for {link_target}, skipping all heading-specific links")
+                    link_groups[link_target] = [None]
+                else:
+                    link_groups[link_target] = list(dict.fromkeys(headings))
+            return link_groups
 
-        # If we've reached the maximum depth, don't process links
-        if current_depth >= self.max_depth:
-            self._debug(f"Reached max depth ({self.max_depth}), not following links in {filename}")
-            return
+    def _resolve_link(self, link_target: str) -> Optional[str]:
+        """Resolve a link target once per run; repeated (and unresolvable) targets are free."""
+        if link_target not in self.resolved_links:
+            self.resolved_links[link_target] = self._normalize_filename(link_target)
+        return self.resolved_links[link_target]
 
-        # Extract all links and organize them by target file
-        raw_links = self.link_pattern.findall(full_content)
-        self._debug(f"Found {len(raw_links)} potential links in {filename}")
+    def link_graph(self) -> LinkGraph:
+        """The vault's LinkGraph, updated incrementally on first use in a run."""
+        if self.graph is None:
+            self.graph = self._new_graph()
+        with self.profiler.phase('graph'):
+            self.graph.ensure_fresh()
+        return self.graph
 
-        # Group links by target file
-        link_groups = {}
-        for match in raw_links:
-            link_target = match[0].strip()
-            heading_target = match[1].strip() if len(match) > 1 and match[1] else None
-            
-            if link_target not in link_groups:
-                link_groups[link_target] = []
-            link_groups[link_target].append(heading_target)
-        
-        # Process each target file exactly once, prioritizing general links
-        for link_target, headings in link_groups.items():
-            normalized_path = self._normalize_filename(link_target)
-            if not normalized_path:
-                self._debug(f"Could not normalize link target: {link_target}")
-                continue
-                
-            self._debug(f"Link target '{link_target}' normalized to: {normalized_path}")
-            
-            # Check if there's a general link (None heading)
-            if None in headings:
-                # Process the general link and skip all heading-specific links
-                self._debug(f"Found general link for {link_target}, skipping all heading-specific links")
-                self._process_file(normalized_path, current_depth + 1)
-            else:
-                # Process each unique heading-specific link
-                unique_headings = list(set(headings))
-                for heading in unique_headings:
-                    if heading:  # Skip empty headings
-                        self._debug(f"Processing heading-specific link: {link_target}#{heading}")
-                        self._process_file(normalized_path, current_depth + 1, specific_heading=heading)
-
-    def _format_tree(self, paths: list[str]) -> list[str]:
-        """Format paths as a tree structure."""
-        if not paths:
+    def _new_graph(self) -> LinkGraph:
+        return LinkGraph(self.vault_path, self._list_notes, lambda target: self._normalize_filename(target, warn=False),
+                         debug=self._debug, workers=max(self.workers, os.cpu_count() or 1))
+
+    def _list_notes(self) -> List[str]:
+        """Every markdown note of the vault, from the index when there is one."""
+        if self.index is not None:
+            self.index.ensure_fresh()
+            return self.index.paths('.md')
+        return [os.path.join(root, name) for root, _, files in self.walker.walk(self.vault_path)
+                for name in files if name.endswith('.md')]
+
+    def closure(self, start_path: str, max_depth: Optional[int] = None) -> List[Tuple[str, Optional[str], int]]:
+        """(path, heading, depth) of every note or section within `max_depth` links of a note."""
+        graph = self.link_graph()
+        normalized_path = self._normalize_filename(start_path)
+        start = graph.node(normalized_path) if normalized_path else None
+        if start is None:
             return []
-            
-        paths.sort()
-        result = []
-        
-        for i, path in enumerate(paths):
-            if i == len(paths) - 1:
-                prefix = "└── "
-            else:
-                prefix = "├── "
-            result.append(prefix + path)
-            
-        return result
+        reached = graph.closure(start, self.max_depth if max_depth is None else max_depth)
+        return sorted(((graph.paths[node], heading, depth) for (node, heading), depth in reached.items()),
+                      key=lambda item: (item[2], item[0], item[1] or ''))
+
+    def backlinks(self, path: str) -> List[str]:
+        """Notes linking to a note."""
+        graph = self.link_graph()
+        normalized_path = self._normalize_filename(path)
+        node = graph.node(normalized_path) if normalized_path else None
+        return [graph.paths[source] for source in graph.backlinks(node)] if node is not None else []
+
+    def orphans(self) -> List[str]:
+        """Notes that neither link to nor are linked from another note."""
+        graph = self.link_graph()
+        return [graph.paths[node] for node in graph.orphans()]
 
     def _generate_output(self) -> str:
         """Generate the final output text."""
@@ -178,54 +2366,113 @@ class ObsidianLinkCollector:
         
         # Add a header with information about the source
         if self.start_file:
-            output_parts.append(f"# Content from {self.start_file}\n")
-            output_parts.append(f"- Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            output_parts.append(f"- Depth: {self.max_depth}")
+            output_parts.extend(self._header_lines())
             output_parts.append(f"- Files collected: {len(self.collected_files)}\n")
+
+        # Render tree lines and content sections in a single pass over the records
+        tree_lines = []
+        content_parts = []
+        for record in self.collected_files:
+            tree_line, section = self._render_entry(record)
+            tree_lines.append(tree_line)
+            content_parts.append(section)
         
         # Add the tree structure when we have more than one file
-        if len(self.collected_files) > 1:
-            tree_structure = self._generate_tree_structure()
+        if len(tree_lines) > 1:
             output_parts.append("## File Structure\n")
-            output_parts.append(tree_structure)
+            output_parts.append(self._format_tree_lines(tree_lines))
             output_parts.append("\n")
         
         # Add each file's content with headers
         output_parts.append("## Content\n")
-        
-        for file_path, content in self.collected_files:
-            # Get the relative path from the vault path
-            try:
-                relative_path = os.path.relpath(file_path, self.vault_path)
-            except ValueError:
-                # Handle case when file_path and self.vault_path are on different drives
-                relative_path = file_path
-                
-            # Add a header with the file name
-            file_name = os.path.basename(file_path)
-            header = f"### {file_name}"
-            output_parts.append(header)
-            
-            # Add the file path
-            output_parts.append(f"Path: `{relative_path}`\n")
-            
-            # Add the content
-            output_parts.append(content)
-            
-            # Add a separator
-            output_parts.append("\n---\n")
+        output_parts.extend(content_parts)
             
+        # Report links dropped by the token/file budget
+        if self.pruned_links:
+            output_parts.extend(self._pruned_lines())
+
         # Generate and append statistics
-        stats = self.get_statistics()
-        output_parts.append("## File Statistics\n")
-        output_parts.append(f"- Total Files: {stats['file_count']}")
-        output_parts.append(f"- Total Lines: {stats['total_lines']}")
-        output_parts.append(f"- Total Size: {stats['total_size']}")
-        output_parts.append(f"- Total Tokens: {stats['total_tokens']}")
+        output_parts.extend(self._statistics_lines(self.get_statistics()))
         
         # Join all parts with newlines
         return "\n".join(output_parts)
 
+    def _header_lines(self) -> List[str]:
+        """Header with information about the source."""
+        lines = [f"# Content from {self.start_file}\n",
+                 f"{AggregateCache.TIMESTAMP_PREFIX}{datetime.now().strftime(AggregateCache.TIMESTAMP_FORMAT)}",
+                 f"- Depth: {self.max_depth}"]
+        if self.profile.steps:
+            lines.append(f"- Profile: {self.profile.name} ({', '.join(self.profile.steps)})")
+        return lines
+
+    def _pruned_lines(self) -> List[str]:
+        budget = ", ".join(part for part in (
+            f"max tokens {self.max_tokens}" if self.max_tokens is not None else "",
+            f"max files {self.max_files}" if self.max_files is not None else "") if part)
+        lines = [f"## Pruned Links ({budget})\n"]
+        # Unresolved entries were skipped before their target was looked up, they are not broken links
+        lines.extend(f"- {link} (depth {depth}, {reason})" if resolved else f"- {link} (not resolved, pruned at depth {depth}, {reason})"
+                     for link, depth, reason, resolved in self.pruned_links)
+        lines.append("")
+        return lines
+
+    def _statistics_lines(self, stats: dict) -> List[str]:
+        lines = ["## File Statistics\n",
+                 f"- Total Files: {stats['file_count']}",
+                 f"- Total Lines: {stats['total_lines']}",
+                 f"- Total Size: {stats['total_size']}",
+                 f"- Total Tokens: {stats['total_tokens']} ({stats['token_method']})"]
+        lines.extend(self._savings_lines(stats))
+        return lines
+
+    def _savings_lines(self, stats: dict) -> List[str]:
+        """Bytes and tokens saved per transformation of the render profile."""
+        if 'saved' not in stats:
+            return []
+        lines = [f"- Saved by profile '{stats['profile']}':"]
+        for step, saved in stats['saved'].items():
+            lines.append(f"  - {step}: {self._format_size(saved['bytes'])}, {saved['tokens']} tokens")
+        return lines
+
+    def _relative_path(self, file_path: str) -> str:
+        """Path relative to the vault, or unchanged when that is not possible."""
+        try:
+            return os.path.relpath(file_path, self.vault_path)
+        except ValueError:
+            # Handle case when file_path and self.vault_path are on different drives
+            return file_path
+
+    def _tree_line(self, record: CollectedNote) -> str:
+        """Render one record as its file-structure line."""
+        relative_path = self._relative_path(record.path)
+
+        tree_line = relative_path
+        if record.heading:
+            tree_line = f"{relative_path} (heading: {record.heading})"
+        aliases = [self._relative_path(path) for path in record.aliases if path != record.path]
+        if aliases:
+            # Same real file reached through other paths: listed here, content not repeated
+            tree_line += f" (aliases: {', '.join(aliases)})"
+        return tree_line
+
+    def _render_entry(self, record: CollectedNote) -> Tuple[str, str]:
+        """Render one record as its file-structure line and its content section."""
+        relative_path = self._relative_path(record.path)
+        tree_line = self._tree_line(record)
+
+        # Header with the file name, the path, the content and a separator
+        section = (f"### {os.path.basename(record.path)}\n"
+                   f"Path: `{relative_path}`\n\n"
+                   f"{record.content}\n"
+                   f"\n---\n")
+        return tree_line, section
+
+    def _format_tree_lines(self, tree_lines: List[str]) -> str:
+        """Sort file-structure lines and draw them as a tree."""
+        tree_lines = sorted(tree_lines)
+        return "\n".join("├── " + line for line in tree_lines[:-1]) + "\n└── " + tree_lines[-1]
+
     def _format_size(self, size_bytes: int) -> str:
         """Convert bytes to human readable format."""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -236,54 +2483,30 @@ class ObsidianLinkCollector:
 
     def _generate_tree_structure(self) -> str:
         """Generate a tree structure of collected files."""
-        tree_lines = []
-        for i, (file_path, content) in enumerate(self.collected_files):
-            # Get the relative path
-            rel_path = os.path.relpath(file_path, self.vault_path)
-            
-            # Find which heading (if any) this file+content was collected with
-            heading = None
-            for file_heading_key, stored_content in self.file_content_map.items():
-                if file_path in file_heading_key and stored_content == content:
-                    # Extract heading from the key (format: filepath#heading)
-                    if '#' in file_heading_key:
-                        heading = file_heading_key.split('#', 1)[1]
-                    break
-            
-            # Add heading information if available
-            if heading:
-                rel_path = f"{rel_path} (heading: {heading})"
-            
-            tree_lines.append(rel_path)
-        
-        tree_lines.sort()
-        return "\n".join("├── " + line for line in tree_lines[:-1]) + "\n└── " + tree_lines[-1]
+        return self._format_tree_lines([self._tree_line(record) for record in self.collected_files])
 
-    def _get_token_count(self, file_path: str) -> int:
-        """Get token count using code2prompt or estimate."""
-        try:
-            result = subprocess.run(
-                ["code2prompt", file_path, "--tokens"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            match = re.search(r'Token count: (\d+)', result.stdout)
-            if match:
-                return int(match.group(1))
-        except Exception as e:
-            self._debug(f"Token count error for {file_path}: {str(e)}")
-        
-        # Fallback: rough estimate based on words
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return len(f.read().split())
-        except Exception as e:
-            self._debug(f"Fallback token count error for {file_path}: {str(e)}")
-            return 0
-
-    def _normalize_filename(self, filename: str) -> Optional[str]:
+    def _normalize_filename(self, filename: str, warn: bool = True) -> Optional[str]:
         """Normalize the filename and find the actual path to the file."""
+        if not self.profiler.enabled:
+            return self._locate(filename, warn)[0]
+        start_time = time.perf_counter()
+        with self.profiler.phase('resolve'):
+            path, strategy = self._locate(filename, warn)
+        self.profiler.link(filename, strategy, time.perf_counter() - start_time, path)
+        return path
+
+    @staticmethod
+    def _normalized_matches(matches: Iterable[str], filename: str) -> List[str]:
+        """Keep the matches whose folders end with the folder part of `filename` (compared by name_key)."""
+        folder = os.path.dirname(filename.replace('\\', '/')).strip('/')
+        if not folder:
+            return list(matches)
+        suffix = '/' + '/'.join(name_key(part) for part in folder.split('/'))
+        return [match for match in matches
+                if ('/' + '/'.join(name_key(part) for part in os.path.dirname(match).split(os.sep))).endswith(suffix)]
+
+    def _locate(self, filename: str, warn: bool = True) -> Tuple[Optional[str], str]:
+        """Find the actual path to a file and name the strategy that found it ('unresolved' if none)."""
         # If the file already exists, return it
         candidate = os.path.join(self.vault_path, filename)
         if os.path.exists(candidate): # os.path.exists resolves symlinks
@@ -295,7 +2518,7 @@ class ObsidianLinkCollector:
                     self._debug(f"Error reading symlink target for {candidate}: {e}")
             else:
                  self._debug(f"Found direct path: {candidate}")
-            return candidate
+            return candidate, 'direct'
 
         # If the path includes .md extension, try with and without it
         base_name = filename
@@ -303,18 +2526,18 @@ class ObsidianLinkCollector:
             base_name = filename[:-3]
 
         # Create a list of possible file variants
-        self.try_variants = [base_name, f"{base_name}.md", f"{base_name}🌳.md",
-                      f"${base_name}.md", f"@{base_name}.md", f"={base_name}.md",
-                      f"$.{base_name}.md", f"$ {base_name}.md", f"$. {base_name}.md"]
-        variant_set = set(self.try_variants) # Use a set for faster lookups
+        try_variants = [base_name, f"{base_name}.md", f"{base_name}🌳.md",
+                        f"${base_name}.md", f"@{base_name}.md", f"={base_name}.md",
+                        f"$.{base_name}.md", f"$ {base_name}.md", f"$. {base_name}.md"]
+        variant_set = set(try_variants) # Use a set for faster lookups
 
         # Common directories to check early
         common_dirs = ["_Outputs_External", "_Outputs_AI", "Dailies_Outputs", "voice-notes", "_official-iteractions-steps", "notes"]
 
-        self._debug(f"Trying variants: {self.try_variants}")
+        self._debug(f"Trying variants: {try_variants}")
 
         # Check variants in the root directory first
-        for variant in self.try_variants:
+        for variant in try_variants:
             full_path = os.path.join(self.vault_path, variant)
             if os.path.exists(full_path): # os.path.exists resolves symlinks
                 self._debug(f"Found variant in root directory: {full_path}")
@@ -324,12 +2547,12 @@ class ObsidianLinkCollector:
                          self._debug(f"  (Symlink -> {link_target})")
                      except Exception as e:
                          self._debug(f"  (Error reading symlink target: {e})")
-                return full_path
+                return full_path, 'variant'
 
         # Check variants in common subdirectories
         self._debug(f"Checking common subdirectories: {common_dirs}")
         for common_dir in common_dirs:
-            for variant in self.try_variants:
+            for variant in try_variants:
                  # Check relative to vault root
                 dir_path_relative = os.path.join(self.vault_path, common_dir)
                 full_path_relative = os.path.join(dir_path_relative, variant)
@@ -341,7 +2564,7 @@ class ObsidianLinkCollector:
                             self._debug(f"  (Symlink -> {link_target})")
                         except Exception as e:
                             self._debug(f"  (Error reading symlink target: {e})")
-                    return full_path_relative
+                    return full_path_relative, 'common-dir'
 
                 # Check relative to __SecondBrain (common pattern observed)
                 second_brain_path = os.path.join(self.vault_path, "__SecondBrain")
@@ -355,7 +2578,7 @@ class ObsidianLinkCollector:
                              self._debug(f"  (Symlink -> {link_target})")
                          except Exception as e:
                              self._debug(f"  (Error reading symlink target: {e})")
-                     return full_path_sb
+                     return full_path_sb, 'common-dir'
 
                 # Check within Projects_PKM (another common pattern)
                 projects_pkm_path = os.path.join(second_brain_path, "Projects_PKM")
@@ -374,7 +2597,7 @@ class ObsidianLinkCollector:
                                            self._debug(f"  (Symlink -> {link_target})")
                                        except Exception as e:
                                            self._debug(f"  (Error reading symlink target: {e})")
-                                   return full_path_proj
+                                   return full_path_proj, 'projects-pkm'
                     except OSError as e:
                          self._debug(f"Error reading project dir {projects_pkm_path}: {e}")
 
@@ -390,7 +2613,7 @@ class ObsidianLinkCollector:
                         self._debug(f"  (Symlink -> {link_target})")
                     except Exception as e:
                         self._debug(f"  (Error reading symlink target: {e})")
-                return rel_path
+                return rel_path, 'relative-path'
             # Try with .md
             if not filename.endswith('.md'):
                 rel_path_md = rel_path + '.md'
@@ -402,10 +2625,33 @@ class ObsidianLinkCollector:
                              self._debug(f"  (Symlink -> {link_target})")
                          except Exception as e:
                              self._debug(f"  (Error reading symlink target: {e})")
-                    return rel_path_md
+                    return rel_path_md, 'relative-path'
 
-        # Otherwise, do a recursive search for any file whose basename matches any variant
+        # Otherwise, look the basename up in the persistent vault index
+        if self.index is not None:
+            with self.profiler.phase('index'):
+                self.index.ensure_fresh()
+            matches = self.index.lookup(try_variants)
+            if matches:
+                best_match = min(matches, key=lambda p: (len(p.split(os.sep)), p))
+                self._debug(f"Found by vault index basename match: {best_match}")
+                return best_match, 'index'
+            # Same lookup ignoring case and Unicode form (NFD names synced from macOS)
+            matches = self._normalized_matches(self.index.lookup_normalized(
+                os.path.basename(variant) for variant in try_variants), filename)
+            if matches:
+                best_match = min(matches, key=lambda p: (len(p.split(os.sep)), p))
+                self._debug(f"Found by vault index normalized name match: {best_match}")
+                return best_match, 'index-normalized'
+            self._debug(f"Could not normalize filename: {filename}")
+            if warn:
+                print(f"WARNING: Could not find file '{filename}' in vault index.")
+            return None, 'unresolved'
+
+        # Without an index, do a recursive search for any file whose basename matches any variant
+        # (compared by name_key, so case and Unicode form do not matter)
         self._debug(f"File not found directly. Recursively searching for basename matches: {variant_set}")
+        key_set = {name_key(os.path.basename(variant)) for variant in try_variants}
         start_time = time.time()
         matches = []
         max_depth = 15 # Increased depth limit
@@ -420,9 +2666,9 @@ class ObsidianLinkCollector:
                 continue # Skip paths outside vault
 
             # Efficiently check files in the current directory
-            found_in_dir = set(files) & variant_set
-            for found_file in found_in_dir:
-                 full_path = os.path.join(root, found_file)
+            found_in_dir = [name for name in files if name in variant_set or name_key(name) in key_set]
+            for found_file in self._normalized_matches([os.path.join(root, name) for name in found_in_dir], filename):
+                 full_path = found_file
                  # Log if symlink before adding
                  if os.path.islink(full_path):
                      try:
@@ -439,8 +2685,8 @@ class ObsidianLinkCollector:
                      if len(matches) > 1:
                          best_match = min([m for m in matches if os.path.relpath(m, self.vault_path).count(os.sep) + 1 <= 2], key=lambda p: (len(p.split(os.sep)), p))
                          self._debug(f"Returning best shallow match: {best_match}")
-                         return best_match
-                     return full_path # Return the first shallow match
+                         return best_match, 'recursive-walk'
+                     return full_path, 'recursive-walk' # Return the first shallow match
 
             # Timeout safeguard
             if time.time() - start_time > timeout_seconds:
@@ -457,317 +2703,310 @@ class ObsidianLinkCollector:
                     self._debug(f"  (Resolved best match is symlink -> {link_target})")
                 except Exception as e:
                     self._debug(f"  (Error reading symlink target for best match: {e})")
-            return best_match
+            return best_match, 'recursive-walk'
 
         self._debug(f"Could not normalize filename: {filename}")
-        print(f"WARNING: Could not find file '{filename}' in vault after recursive search.")
-        return None
+        if warn:
+            print(f"WARNING: Could not find file '{filename}' in vault after recursive search.")
+        return None, 'unresolved'
 
     def _custom_walk(self, top):
         """A custom walk function that follows symlinks and skips hidden/temp dirs."""
-        # Keep track of visited inodes to prevent cycles
-        visited_inodes_walk = set()
-        queue = [(top, 0)] # (path, depth)
-        max_walk_depth = 15 # Same depth limit as in normalize
-
-        # Add the starting directory's canonical inode to prevent infinite loops if
-        # the vault root itself is part of a cycle, but allow traversal into it initially.
-        try:
-            top_stat = os.stat(os.path.realpath(top))
-            top_inode = (top_stat.st_dev, top_stat.st_ino)
-            # Don't add top_inode to visited_inodes_walk immediately, 
-            # add it only when it's processed from the queue if it's not the initial top path.
-            # This allows entering symlinked directories within the top level initially.
-            self._debug(f"Starting walk from: {top} (inode {top_inode})")
-        except OSError as e:
-            self._debug(f"Cannot stat starting path {top}: {e}. Aborting walk.")
-            return
-
-        while queue:
-            # Use BFS approach (pop from start) to find shallow files first
-            current_path, current_depth = queue.pop(0)
-
-            # Skip if too deep
-            if current_depth > max_walk_depth:
-                self._debug(f"Skipping path, max depth {max_walk_depth} reached: {current_path}")
-                continue
-
-            # --- Cycle Detection --- 
-            # Check the inode of the path *itself* (link or directory)
-            try:
-                current_lstat = os.lstat(current_path)
-                current_inode = (current_lstat.st_dev, current_lstat.st_ino)
-                if current_inode in visited_inodes_walk:
-                    self._debug(f"Cycle detected (link/dir inode already visited): {current_path} (inode {current_inode})")
-                    continue
-                # Mark this specific path/link inode as visited *before* processing contents
-                visited_inodes_walk.add(current_inode)
-            except OSError as e:
-                 self._debug(f"Error lstatting path {current_path}: {e}")
-                 continue # Skip if lstat fails
-
-            # Also check the inode of the *resolved* path (target of link or the dir itself)
-            # This handles cases where different links point to the same target directory.
-            try:
-                real_path = os.path.realpath(current_path)
-                # Check if real path exists before statting
-                if not os.path.exists(real_path):
-                     self._debug(f"Skipping non-existent resolved path: {current_path} -> {real_path}")
-                     continue
-                target_stat = os.stat(real_path)
-                target_inode = (target_stat.st_dev, target_stat.st_ino)
-                # Add target inode ONLY if it's different from the link inode itself
-                if target_inode != current_inode:
-                     if target_inode in visited_inodes_walk:
-                         self._debug(f"Cycle detected (target inode already visited): {current_path} -> {real_path} (inode {target_inode})")
-                         continue
-                     # Mark target inode as visited *before* processing contents
-                     visited_inodes_walk.add(target_inode)
-            except OSError as e:
-                 self._debug(f"Error resolving/statting real path for {current_path}: {e}")
-                 continue # Skip if realpath or stat fails
-            # --- End Cycle Detection ---
-
-            # Log entry into directory
-            self._debug(f"Scanning directory (depth {current_depth}): {current_path}")
-
-            # Yield current level
-            try:
-                dirs_to_yield = []
-                files_to_yield = []
-                # Use scandir for potentially better performance and type checking
-                for entry in os.scandir(current_path):
-                    # Skip hidden files/dirs and temp
-                    if entry.name.startswith('.') or entry.name == 'temp':
-                        continue
-
-                    entry_path = os.path.join(current_path, entry.name)
-
-                    # Use lstat to check the entry without following links initially
-                    try:
-                        entry_lstat = os.lstat(entry_path)
-                        entry_inode = (entry_lstat.st_dev, entry_lstat.st_ino)
-                        is_symlink_entry = os.path.islink(entry_path)
-                    except OSError as e:
-                         self._debug(f"Error lstatting entry {entry_path}: {e}")
-                         continue # Skip entry if cannot lstat
-
-                    # Check if this entry's inode (link or dir/file) has already been visited
-                    if entry_inode in visited_inodes_walk:
-                        self._debug(f"Skipping already visited entry inode: {entry_path} (inode {entry_inode})")
-                        continue
-
-                    # Handle directories and directory symlinks
-                    # Check if it IS a directory OR (it is a symlink AND its target is a directory)
-                    is_effective_dir = False
-                    try:
-                        if os.path.isdir(entry_path): # This follows links
-                            is_effective_dir = True
-                    except OSError as e:
-                        self._debug(f"Error checking if entry is directory: {entry_path}: {e}")
-                        continue
-                        
-                    if is_effective_dir:
-                        target_inode_entry = None
-                        real_target_path = entry_path
-                        # If it's a symlink, check its resolved target's inode too
-                        if is_symlink_entry:
-                             try:
-                                 real_target_path = os.path.realpath(entry_path)
-                                 if not os.path.exists(real_target_path):
-                                     self._debug(f"Symlink dir target does not exist: {entry_path} -> {real_target_path}")
-                                     continue # Skip broken link
-                                 target_stat_entry = os.stat(real_target_path)
-                                 target_inode_entry = (target_stat_entry.st_dev, target_stat_entry.st_ino)
-                                 self._debug(f"Dir symlink entry: {entry_path} -> {real_target_path} (link_inode {entry_inode}, target_inode {target_inode_entry})")
-                                 # Check target inode for cycles
-                                 if target_inode_entry != entry_inode and target_inode_entry in visited_inodes_walk:
-                                     self._debug(f"Skipping symlink dir - target inode already visited: {real_target_path} (inode {target_inode_entry})")
-                                     continue
-                             except Exception as e:
-                                 self._debug(f"Error reading/statting symlink target for dir entry {entry_path}: {e}")
-                                 continue
-
-                        # If we got here, the entry (dir or link to dir) seems safe to add to queue
-                        self._debug(f"Queueing directory: {entry_path}")
-                        dirs_to_yield.append(entry.name)
-                        queue.append((entry_path, current_depth + 1))
-                        # Mark inodes as visited ONLY AFTER successfully queueing
-                        # visited_inodes_walk.add(entry_inode) 
-                        # We already added current_inode and target_inode at the start of the loop for current_path.
-                        # Adding entry inodes here can prematurely block sibling directories if they are hardlinked.
-                        # Let the check at the start of the while loop handle visited inodes when the path is popped from the queue.
-
-
-                    # Handle files and file symlinks
-                    # Check if it IS a file OR (it is a symlink AND its target is a file)
-                    is_effective_file = False
-                    try:
-                        if os.path.isfile(entry_path): # This follows links
-                             is_effective_file = True
-                    except OSError as e:
-                        self._debug(f"Error checking if entry is file: {entry_path}: {e}")
-                        continue
-                        
-                    if is_effective_file:
-                        # Check target existence for symlinks
-                        if is_symlink_entry:
-                             try:
-                                 real_target_path = os.path.realpath(entry_path)
-                                 if not os.path.exists(real_target_path) or not os.path.isfile(real_target_path):
-                                     self._debug(f"Symlink file target does not exist or is not a file: {entry_path} -> {real_target_path}")
-                                     continue # Skip broken link or link to non-file
-                                 self._debug(f"File symlink entry: {entry_path} -> {real_target_path}")
-                             except OSError as e:
-                                 self._debug(f"Error resolving/checking file symlink target {entry_path}: {e}")
-                                 continue
-                        
-                        # If we got here, it's a file or a valid link to a file
-                        self._debug(f"Yielding file: {entry_path}")
-                        files_to_yield.append(entry.name)
-                        # Mark file/link inode as visited (optional, but can prevent processing hardlinked files twice)
-                        # visited_inodes_walk.add(entry_inode)
-
-                # Yield after processing directory contents
-                yield current_path, dirs_to_yield, files_to_yield
-
-            except OSError as e:
-                self._debug(f"Error scanning directory {current_path}: {e}")
-                continue # Skip directories we can't read
+        return self.walker.walk(top)
 
     def get_statistics(self) -> dict:
         """Get statistics about processed files."""
-        total_lines = sum(len(content.splitlines()) for _, content in self.collected_files)
-        
-        # Calculate size based on the actual collected content, not original file sizes
-        total_content_size = sum(len(content.encode('utf-8')) for _, content in self.collected_files)
-        
-        # Calculate token count based on the actual content
-        total_tokens = 0
-        for _, content in self.collected_files:
-            # Estimate tokens: roughly 4 characters per token
-            total_tokens += len(content.split())
+        if self._cached_stats is not None:
+            return self._cached_stats
+        if self.writer is not None:
+            # Streamed records no longer hold their content; the writer counted it
+            return self._add_savings({
+                'file_count': self.writer.file_count,
+                'total_lines': self.writer.total_lines,
+                'total_size': self._format_size(self.writer.total_bytes),
+                'total_tokens': self.writer.total_tokens,
+                'token_method': self.token_counter.method
+            })
+
+        total_lines = 0
+        total_content_size = 0
+        for record in self.collected_files:
+            total_lines += len(record.content.splitlines())
+            # Calculate size based on the actual collected content, not original file sizes
+            total_content_size += len(record.content.encode('utf-8'))
+        # Count tokens of all collected sections in one batch
+        total_tokens = sum(self._count_tokens_many([record.content for record in self.collected_files]))
         
-        return {
+        return self._add_savings({
             'file_count': len(self.collected_files),
             'total_lines': total_lines,
             'total_size': self._format_size(total_content_size),
-            'total_tokens': total_tokens
-        }
+            'total_tokens': total_tokens,
+            'token_method': self.token_counter.method
+        })
+
+    def _add_savings(self, stats: dict) -> dict:
+        """Add the render profile and what each of its transformations saved."""
+        if self.profile.steps:
+            stats['profile'] = self.profile.name
+            stats['saved'] = {step: {'bytes': saved_bytes, 'tokens': saved_tokens}
+                              for step, (saved_bytes, saved_tokens) in self.profile.saved.items()}
+        return stats
 
     def _extract_section(self, content: str, heading: str) -> Optional[str]:
         """Extracts the content under a specific markdown heading."""
-        # Normalize heading for matching (case-insensitive, strip whitespace)
-        normalized_heading = heading.strip().lower()
-        # Replace some common punctuation/formatting with spaces for better matching
-        normalized_heading = re.sub(r'[:_\-]', ' ', normalized_heading)
-        # Remove extra spaces
-        normalized_heading = re.sub(r'\s+', ' ', normalized_heading).strip()
-        
-        self._debug(f"Looking for normalized heading: '{normalized_heading}'")
-        
-        lines = content.splitlines()
-        start_line = -1
-        heading_level = -1
-        
-        # Find the heading line and its level
-        for i, line in enumerate(lines):
-            stripped_line = line.strip()
-            if stripped_line.startswith('#'):
-                level = stripped_line.count('#', 0, 6) # Max heading level 6
-                # Extract heading text after the # symbols and removing any trailing #s (for markdown style)
-                heading_text = stripped_line[level:].strip().lower()
-                heading_text = heading_text.rstrip('#').strip()  # Handle ### Header ### style
-                
-                # Normalize the found heading text in the same way as the target
-                heading_text = re.sub(r'[:_\-]', ' ', heading_text)
-                heading_text = re.sub(r'\s+', ' ', heading_text).strip()
-                
-                self._debug(f"Checking heading at line {i+1}: '{heading_text}' (level {level}) against '{normalized_heading}'")
-                
-                if heading_text == normalized_heading:
-                    start_line = i
-                    heading_level = level
-                    self._debug(f"Found matching heading '{heading}' at line {i+1}, level {level}")
-                    break
-                    
-        if start_line == -1:
-            self._debug(f"Heading '{heading}' not found in content")
-            return None # Heading not found
-            
-        # Find the end of the section (next heading of same or lower level, or EOF)
-        end_line = len(lines)
-        for i in range(start_line + 1, len(lines)):
-            stripped_line = lines[i].strip()
-            if stripped_line.startswith('#'):
-                level = stripped_line.count('#', 0, 6)
-                if level <= heading_level:
-                    end_line = i
-                    self._debug(f"End of section found at line {i+1} (next heading of level {level})")
-                    break
-                    
-        # Extract the lines for the section (including the heading line itself)
-        section_lines = lines[start_line:end_line]
-        section_content = "\n".join(section_lines)
-        self._debug(f"Extracted section with {len(section_lines)} lines")
-        return section_content
+        return CachedNote('', content).section(heading)
 
-def main():
-    parser = argparse.ArgumentParser(description='Process Obsidian vault links.')
-    parser.add_argument('input_file', help='The starting Obsidian note')
+    def _extract_block(self, content: str, block_id: str) -> Optional[str]:
+        """Extracts the paragraph or list item tagged with a ^block-id."""
+        return CachedNote('', content).block(block_id)
+
+def tiktoken_encoding(name: str) -> str:
+    """argparse type for --encoding: reject names tiktoken does not know."""
+    if tiktoken is not None and name not in tiktoken.list_encoding_names():
+        raise argparse.ArgumentTypeError(f"unknown tiktoken encoding '{name}' "
+                                         f"(choose from {', '.join(tiktoken.list_encoding_names())})")
+    return name
+
+
+def add_collection_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options shared by single runs and `batch`."""
     parser.add_argument('--depth', type=int, default=5, help='Maximum depth to follow links')
-    parser.add_argument('--output', help='Output file path')
     parser.add_argument('--vault-path', help='Path to the Obsidian vault')
     parser.add_argument('--debug', action='store_true', help='Enable debug output')
+    parser.add_argument('--no-index', action='store_true', help='Search the vault recursively instead of using the basename index')
+    parser.add_argument('--rebuild-index', action='store_true', help='Rebuild the basename index before resolving links')
+    parser.add_argument('--workers', type=int, default=1, help='Expand links level by level with N threads (default: 1, depth-first). '
+                             'Breadth-first collects each note at its shortest link distance, so with '
+                             '--depth limits it can include notes depth-first misses (and orders them by level)')
+    parser.add_argument('--stream', action='store_true', help='Write content to the output file as it is collected (file structure goes last)')
+    parser.add_argument('--max-tokens', type=int, help='Stop expanding links once the aggregate reaches this many tokens. '
+                        'Collection stops at the first note that does not fit: later, smaller notes of the same level are pruned too')
+    parser.add_argument('--max-files', type=int, help='Stop expanding links once this many files/sections are collected')
+    parser.add_argument('--encoding', type=tiktoken_encoding, default=TokenCounter.DEFAULT_ENCODING, help='tiktoken encoding used for token counts (default: cl100k_base; without tiktoken tokens are estimated)')
+    parser.add_argument('--profile', choices=sorted(RenderProfile.PROFILES), default='raw',
+                        help='Render profile: raw (verbatim), compact (no frontmatter/data URIs, collapsed whitespace), minimal (also no attachment embeds or repeated blocks)')
+    parser.add_argument('--no-cache', action='store_true', help='Always collect again instead of reusing the manifest of the previous identical aggregate. '
+                        'When any note of it changed, the whole closure is read again and only link resolutions are reused')
+    parser.add_argument('--link-graph', action='store_true', help='Take links of unchanged notes from the cached vault link graph instead of scanning them')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Process Obsidian vault links.',
+                                     epilog="Run '%(prog)s batch --help' to aggregate many start notes in one process "
+                                            "and '%(prog)s graph --help' to query the vault link graph. "
+                                            "Vault walks skip hidden entries, temp and dependency folders; "
+                                            "add gitignore-style patterns to <vault>/.o2pignore to change that.")
+    parser.add_argument('input_file', nargs='?', help='The starting Obsidian note')
+    parser.add_argument('--output', help='Output file path')
     parser.add_argument('--clipboard', action='store_true', help='Copy result to clipboard')
+    add_collection_arguments(parser)
+    parser.add_argument('--structure-file', help='With --stream, write the file structure to this sidecar file instead of a trailer')
+    parser.add_argument('--profile-json', metavar='PATH', help="Write wall time and call counts per phase and per-link resolution timings as JSON ('-' for stdout)")
+    parser.add_argument('--profile-top', type=int, default=20, help='Number of slowest links listed by --profile-json (default: 20)')
+    parser.add_argument('--serve', action='store_true', help='Run as a daemon keeping the vault index and caches warm (see obs2prompt_client.py)')
+    parser.add_argument('--no-watch', action='store_true', help='With --serve, revalidate the index by directory mtimes instead of inotify')
+    parser.add_argument('--socket', default=default_socket_path(), help='Unix socket for --serve (default: $O2P_SOCKET or a per-user temp path)')
     parser.add_argument('--version', action='version', version='%(prog)s 1.3.0')
-    args = parser.parse_args()
-    
-    # Determine vault path
+    return parser
+
+
+def build_batch_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} batch",
+                                     description='Aggregate many start notes in one process, sharing the vault index and caches.')
+    parser.add_argument('roots_file', help="File with one start note per line ('#' comments and blank lines are ignored)")
+    parser.add_argument('--out-dir', required=True, help='Directory for the aggregates and the JSON summary')
+    parser.add_argument('--jobs', type=int, default=min(8, os.cpu_count() or 1), help='Start notes processed in parallel (default: min(8, CPUs))')
+    parser.add_argument('--summary', help='Path of the JSON summary (default: OUT_DIR/o2p_batch_summary.json)')
+    add_collection_arguments(parser)
+    return parser
+
+
+def build_graph_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} graph",
+                                     description='Build or update the cached vault link graph and query it.')
+    parser.add_argument('--closure', metavar='NOTE', help='List notes and sections within --depth links of NOTE')
+    parser.add_argument('--backlinks', metavar='NOTE', help='List notes linking to NOTE')
+    parser.add_argument('--orphans', action='store_true', help='List notes without links in either direction')
+    parser.add_argument('--depth', type=int, default=5, help='Depth of --closure')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--vault-path', help='Path to the Obsidian vault')
+    parser.add_argument('--debug', action='store_true', help='Enable debug output')
+    parser.add_argument('--no-index', action='store_true', help='List notes with a vault walk instead of the basename index')
+    parser.add_argument('--rebuild-index', action='store_true', help='Rebuild the basename index first')
+    parser.add_argument('--rebuild-graph', action='store_true', help='Parse every note again instead of only changed ones')
+    return parser
+
+
+def resolve_vault_path(args) -> str:
+    """Determine vault path: --vault-path, $OBSIDIAN_VAULT_PATH, then the home directory."""
     vault_path = args.vault_path
     if not vault_path:
         vault_path = os.environ.get('OBSIDIAN_VAULT_PATH')
         if not vault_path:
             # Default to the user's home directory
             vault_path = os.path.expanduser('~')
+    return vault_path
+
+
+def make_collector(args, vault_path: str, shared: dict, rebuild_index: Optional[bool] = None,
+                   profile_phases: bool = False) -> ObsidianLinkCollector:
+    """Create a collector for `args`, reusing (and filling) the warm state in `shared`."""
+    token_counters = shared.setdefault('token_counters', {})
+    collector = ObsidianLinkCollector(vault_path, args.depth, args.debug,
+                                      use_index=not args.no_index,
+                                      rebuild_index=args.rebuild_index if rebuild_index is None else rebuild_index,
+                                      workers=args.workers,
+                                      encoding=args.encoding,
+                                      max_tokens=args.max_tokens,
+                                      max_files=args.max_files,
+                                      index=shared.get('index'),
+                                      note_cache=shared.get('note_cache'),
+                                      token_counter=token_counters.get(args.encoding),
+                                      use_graph=args.link_graph,
+                                      graph=shared.get('graph'),
+                                      profile=args.profile,
+                                      cache_aggregates=not args.no_cache,
+                                      profile_phases=profile_phases)
+    if collector.index is not None:
+        shared.setdefault('index', collector.index)
+    shared.setdefault('note_cache', collector.note_cache)
+    if collector.graph is not None:
+        shared.setdefault('graph', collector.graph)
+    token_counters.setdefault(args.encoding, collector.token_counter)
+    return collector
+
+
+def graph_command(args, shared: Optional[dict] = None) -> int:
+    """Update the vault link graph and print closures, backlinks or orphans."""
+    vault_path = resolve_vault_path(args)
+    shared = shared if shared is not None else {}
+    collector = ObsidianLinkCollector(vault_path, args.depth, args.debug,
+                                      use_index=not args.no_index,
+                                      rebuild_index=args.rebuild_index,
+                                      index=shared.get('index'),
+                                      note_cache=shared.get('note_cache'),
+                                      use_graph=True,
+                                      graph=shared.get('graph'))
+    if collector.index is not None:
+        shared.setdefault('index', collector.index)
+    shared.setdefault('note_cache', collector.note_cache)
+    shared.setdefault('graph', collector.graph)
+    if args.rebuild_graph:
+        collector.graph.begin_run(rebuild=True)
+    graph = collector.link_graph()
+
+    results = {}
+    if args.closure:
+        results['closure'] = [{'path': collector._relative_path(path), 'heading': heading, 'depth': depth}
+                              for path, heading, depth in collector.closure(args.closure, args.depth)]
+    if args.backlinks:
+        results['backlinks'] = [collector._relative_path(path) for path in collector.backlinks(args.backlinks)]
+    if args.orphans:
+        results['orphans'] = [collector._relative_path(path) for path in collector.orphans()]
+    if not results:
+        results['graph'] = {'notes': len(graph.paths), 'links': len(graph.targets),
+                            'link_targets': len(graph.target_names), 'parsed': graph.parsed,
+                            'cache': graph.cache_path}
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return 0
+    for name, value in results.items():
+        if name == 'graph':
+            print(f"Link graph: {value['notes']} notes, {value['links']} links to {value['link_targets']} targets "
+                  f"({value['parsed']} notes parsed)")
+            print(f"Saved to: {value['cache']}")
+            continue
+        print(f"## {name.capitalize()} ({len(value)})")
+        for item in value:
+            if name == 'closure':
+                heading = f" (heading: {item['heading']})" if item['heading'] else ""
+                print(f"{item['depth']}  {item['path']}{heading}")
+            else:
+                print(item)
+    return 0
+
+
+def aggregate_file_name(input_file: str) -> str:
+    base_name = os.path.basename(input_file).replace('.md', '')
+    return f"o2p_aggregate_{base_name}.txt"
+
+
+def write_aggregate(collector: ObsidianLinkCollector, input_file: str, output_path: str,
+                    stream: bool = False, structure_path: Optional[str] = None) -> Optional[str]:
+    """Collect from `input_file` into `output_path`; returns the text unless streamed."""
+    if stream:
+        # Content goes to disk as it is collected; nothing is held in memory
+        collector.stream(input_file, output_path, structure_path)
+        return None
+    result = collector.process(input_file)
+
+    # Write to file
+    with collector.profiler.phase('write'), open(output_path, 'w', encoding='utf-8') as f:
+        f.write(result)
+    return result
+
+
+def run(args, shared: Optional[dict] = None) -> int:
+    """Aggregate one start note. `shared` carries warm state between runs of a daemon."""
+    vault_path = resolve_vault_path(args)
     
     print(f"Using vault path: {vault_path}")
     
-    # Create collector instance
-    collector = ObsidianLinkCollector(vault_path, args.depth, args.debug)
+    # Create collector instance, reusing warm state when running as a daemon
+    shared = shared if shared is not None else {}
+    collector = make_collector(args, vault_path, shared, profile_phases=bool(args.profile_json))
     
     # Process the input file
     try:
-        result = collector.process(args.input_file)
-        
-        # Get statistics for printing
-        stats = collector.get_statistics()
-        
         # Determine where to save
         if args.output:
             output_path = args.output
         else:
             temp_dir = os.path.join(vault_path, 'temp')
             os.makedirs(temp_dir, exist_ok=True)
-            base_name = os.path.basename(args.input_file).replace('.md', '')
-            output_path = os.path.join(temp_dir, f"o2p_aggregate_{base_name}.txt")
+            output_path = os.path.join(temp_dir, aggregate_file_name(args.input_file))
+
+        result = write_aggregate(collector, args.input_file, output_path, args.stream, args.structure_file)
         
-        # Write to file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(result)
+        # Get statistics for printing
+        stats = collector.get_statistics()
+        collector.token_counter.save()
         
         # Display summary
         print("\nFile Statistics:")
         print(f"- Total Files: {stats['file_count']}")
         print(f"- Total Lines: {stats['total_lines']}")
         print(f"- Total Size: {stats['total_size']}")
-        print(f"- Total Tokens: {stats['total_tokens']}")
+        print(f"- Total Tokens: {stats['total_tokens']} ({stats['token_method']})")
+        for line in collector._savings_lines(stats):
+            print(line)
+        if collector.cache_status == 'hit':
+            print("- Aggregate cache: nothing changed, reused the previous output")
+        elif collector.cache_status == 'partial':
+            print(f"- Aggregate cache: re-collected ({collector.cache_changed} notes changed), link resolutions reused")
+        if collector.pruned_links:
+            print(f"- Pruned Links: {len(collector.pruned_links)} (budget reached, see 'Pruned Links' in the output)")
         print(f"\nResults saved to: {output_path}")
+        if args.stream and args.structure_file:
+            print(f"File structure saved to: {args.structure_file}")
+        if args.profile_json:
+            report = json.dumps(collector.profile_report(args.profile_top), indent=2, ensure_ascii=False)
+            if args.profile_json == '-':
+                print(report)
+            else:
+                with open(args.profile_json, 'w', encoding='utf-8') as f:
+                    f.write(report + "\n")
+                print(f"Profile saved to: {args.profile_json}")
         
         # Copy to clipboard if requested
         if args.clipboard:
             if pyperclip:
                 try:
+                    if result is None:
+                        with open(output_path, 'r', encoding='utf-8') as f:
+                            result = f.read()
                     pyperclip.copy(result)
                     print("Content copied to clipboard!")
                 except Exception as e:
@@ -778,11 +3017,268 @@ def main():
     except Exception as e:
         print(f"Error processing file: {str(e)}")
         if args.debug:
-            import traceback
             traceback.print_exc()
         return 1
         
     return 0
 
+def read_roots(roots_file: str) -> List[str]:
+    """Start notes listed in a roots file, in order and without duplicates."""
+    with open(roots_file, 'r', encoding='utf-8') as f:
+        lines = (line.strip() for line in f)
+        return list(dict.fromkeys(line for line in lines if line and not line.startswith('#')))
+
+
+def batch(args, shared: Optional[dict] = None) -> int:
+    """Aggregate every start note of `args.roots_file` into `args.out_dir`.
+
+    All roots share one vault index, note cache and token cache, and up to
+    `args.jobs` of them are collected at the same time. Besides one aggregate
+    per root, a JSON summary with the statistics of every root is written.
+    """
+    vault_path = resolve_vault_path(args)
+    print(f"Using vault path: {vault_path}")
+    try:
+        roots = read_roots(args.roots_file)
+    except OSError as e:
+        print(f"Error reading roots file: {e}")
+        return 1
+    os.makedirs(args.out_dir, exist_ok=True)
+    summary_path = args.summary or os.path.join(args.out_dir, 'o2p_batch_summary.json')
+
+    # Collectors are created up front on this thread: only the first one may rebuild
+    # the index, and none of them resets the shared caches while others are running
+    shared = shared if shared is not None else {}
+    jobs = []
+    used_names: Set[str] = set()
+    for number, root in enumerate(roots):
+        name = aggregate_file_name(root)
+        stem, ext = os.path.splitext(name)
+        suffix = 2
+        while name in used_names:  # Same basename in different folders
+            name = f"{stem}_{suffix}{ext}"
+            suffix += 1
+        used_names.add(name)
+        collector = make_collector(args, vault_path, shared, rebuild_index=args.rebuild_index and number == 0)
+        jobs.append((root, os.path.join(args.out_dir, name), collector))
+    if shared.get('index') is not None:
+        shared['index'].ensure_fresh()
+
+    def aggregate_root(job) -> dict:
+        root, output_path, collector = job
+        start_time = time.time()
+        entry = {'root': root, 'output': output_path}
+        try:
+            write_aggregate(collector, root, output_path, args.stream)
+            entry['status'] = 'ok' if collector.collected_files else 'not found'
+            entry.update(collector.get_statistics())
+            entry['pruned_links'] = len(collector.pruned_links)
+        except Exception as e:
+            entry['status'] = 'error'
+            entry['error'] = str(e)
+            if args.debug:
+                traceback.print_exc()
+        entry['seconds'] = round(time.time() - start_time, 3)
+        return entry
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        results = []
+        for entry in pool.map(aggregate_root, jobs):
+            print(f"[{entry['status']}] {entry['root']} -> {entry['output']}"
+                  + (f" ({entry['file_count']} files, {entry['total_tokens']} tokens, {entry['seconds']}s)"
+                     if 'file_count' in entry else f" ({entry.get('error', 'no files collected')})"))
+            results.append(entry)
+
+    note_cache = shared['note_cache'] if jobs else None
+    token_counters = shared.get('token_counters', {})
+    for counter in token_counters.values():
+        counter.save()
+    summary = {
+        'vault_path': os.path.abspath(vault_path),
+        'generated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'depth': args.depth,
+        'roots': results,
+        'totals': {
+            'roots': len(results),
+            'failed': sum(1 for entry in results if entry['status'] != 'ok'),
+            'file_count': sum(entry.get('file_count', 0) for entry in results),
+            'total_tokens': sum(entry.get('total_tokens', 0) for entry in results),
+            'seconds': round(time.time() - start_time, 3),
+        },
+        'shared_cache': {
+            'note_reads': note_cache.reads if note_cache else 0,
+            'token_cache_hits': sum(counter.hits for counter in token_counters.values()),
+            'token_cache_misses': sum(counter.misses for counter in token_counters.values()),
+        },
+    }
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+    totals = summary['totals']
+    print(f"\nBatch: {totals['roots']} roots, {totals['failed']} failed, {totals['file_count']} files, "
+          f"{totals['total_tokens']} tokens in {totals['seconds']}s")
+    print(f"Summary saved to: {summary_path}")
+    return 1 if totals['failed'] else 0
+
+
+# Sub-commands given as the first argument: name -> (argument parser factory, command)
+SUBCOMMANDS = {
+    'batch': (build_batch_parser, batch),
+    'graph': (build_graph_parser, graph_command),
+}
+
+
+def serve(socket_path: str, debug: bool = False, watch: bool = True) -> int:
+    """Answer aggregate requests on a Unix socket, keeping index and caches warm between them.
+
+    Protocol: the client sends one JSON object {"argv": [...], "cwd": "..."} and
+    closes its write side; the server replies {"exit_code": int, "stdout": "..."}.
+    {"command": "ping"} and {"command": "shutdown"} are also understood.
+    Requests are handled one at a time, each with the client's working directory.
+    With `watch`, each vault's index is kept current by a VaultWatcher (Linux).
+    """
+    if os.path.exists(socket_path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+            print(f"obs2prompt server already running on {socket_path}")
+            return 1
+        except OSError:
+            os.unlink(socket_path)  # Stale socket from a previous run
+
+    shared_by_vault: Dict[str, dict] = {}
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(8)
+    print(f"obs2prompt server listening on {socket_path}")
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                # Requests are served one at a time: a client that never sends must not block the others
+                conn.settimeout(SERVE_RECV_TIMEOUT)
+                try:
+                    request = json.loads(_recv_all(conn).decode('utf-8'))
+                    if not isinstance(request, dict):
+                        raise ValueError("expected a JSON object")
+                except (ValueError, OSError) as e:
+                    _send_reply(conn, {'exit_code': 2, 'stdout': f"Bad request: {e}\n"})
+                    continue
+                command = request.get('command', 'run')
+                if command == 'ping':
+                    _send_reply(conn, {'exit_code': 0, 'stdout': f"obs2prompt server on {socket_path}\n"})
+                    continue
+                if command == 'shutdown':
+                    _send_reply(conn, {'exit_code': 0, 'stdout': "obs2prompt server stopped\n"})
+                    break
+                start_time = time.time()
+                response = _serve_request(request, shared_by_vault, watch, debug)
+                _send_reply(conn, response)
+                if debug:
+                    print(f"DEBUG: {request.get('argv')} -> {response['exit_code']} ({time.time() - start_time:.3f}s)")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        for shared in shared_by_vault.values():
+            if shared.get('watcher'):
+                shared['watcher'].stop()
+    return 0
+
+
+def _serve_request(request: dict, shared_by_vault: Dict[str, dict], watch: bool = True,
+                   debug: bool = False) -> dict:
+    parser = build_parser()
+    output = io.StringIO()
+    exit_code = 0
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            argv = request.get('argv', [])
+            if argv[:1] and argv[0] in SUBCOMMANDS:
+                build_subparser, command = SUBCOMMANDS[argv[0]]
+                args = build_subparser().parse_args(argv[1:])
+            else:
+                command = run
+                args = parser.parse_args(argv)
+                if not args.input_file or args.serve:
+                    parser.error('the server needs an input_file and cannot --serve')
+            os.chdir(request.get('cwd') or os.getcwd())
+            vault_path = os.path.abspath(resolve_vault_path(args))
+            shared = shared_by_vault.setdefault(vault_path, {})
+            _reload_ignore_rules(vault_path, shared)
+            exit_code = command(args, shared)
+            if watch and shared.get('index') is not None and 'watcher' not in shared:
+                # From now on the index follows the vault through inotify instead of mtime checks
+                # The watcher thread logs to the daemon's stderr, never into a reply being captured
+                watcher = VaultWatcher(shared['index'], debug=_daemon_debug if debug else None)
+                shared['watcher'] = watcher if watcher.start() else None
+        except SystemExit as e:  # argparse errors and --help/--version
+            exit_code = e.code if isinstance(e.code, int) else 0
+        except Exception:
+            # A failing request (vanished cwd, unreadable vault, ...) must not take the daemon down
+            traceback.print_exc(file=output)
+            exit_code = 1
+    return {'exit_code': exit_code, 'stdout': output.getvalue()}
+
+
+def _daemon_debug(msg: str) -> None:
+    print(f"DEBUG: {msg}", file=sys.__stderr__)
+
+
+def _reload_ignore_rules(vault_path: str, shared: dict) -> None:
+    """Drop the warm index (and what depends on it) once the vault's ignore rules change."""
+    try:
+        st = os.stat(os.path.join(vault_path, IgnoreRules.FILE_NAME))
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+    if shared.get('ignore_stamp', stamp) == stamp:
+        shared['ignore_stamp'] = stamp
+        return
+    shared['ignore_stamp'] = stamp
+    index = shared.get('index')
+    if index is None or index.walker.rules_digest == IgnoreRules.load(vault_path).digest:
+        return
+    index._debug(f"{IgnoreRules.FILE_NAME} changed, rebuilding the vault index")
+    if shared.get('watcher'):
+        shared['watcher'].stop()
+    for key in ('index', 'watcher', 'graph'):
+        shared.pop(key, None)
+
+
+def _send_reply(conn: socket.socket, response: dict) -> None:
+    try:
+        conn.sendall(json.dumps(response).encode('utf-8'))
+    except OSError:
+        pass  # The client went away; keep serving the others
+
+
+def _recv_all(conn: socket.socket) -> bytes:
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def main():
+    if sys.argv[1:2] and sys.argv[1] in SUBCOMMANDS:
+        build_subparser, command = SUBCOMMANDS[sys.argv[1]]
+        return command(build_subparser().parse_args(sys.argv[2:]))
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.socket, args.debug, watch=not args.no_watch)
+    if not args.input_file:
+        parser.error('the following arguments are required: input_file')
+    return run(args)
+
+
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -7,7 +7,7 @@ Uses informative naming: task012-Implement-AI-System_project-name__done.md
 
 Features:
 - Informative symlink names with title and status
-- Auto-update mode with 5-minute intervals
+- Auto-update mode: inotify re-sync within a second on Linux, adaptive polling elsewhere
 - Smart change detection to avoid unnecessary updates
 - Cross-platform daemon support
 
@@ -28,12 +28,17 @@ import argparse
 import time
 import hashlib
 import json
+import select
 import signal
+import struct
 import subprocess
+import tempfile
+import threading
 from pathlib import Path
 import re
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Set, Tuple
 
 
 class TaskInfo:
@@ -48,14 +53,160 @@ class TaskInfo:
         return f"Task {self.task_id}: {self.title} [{self.status}]"
 
 
+class InotifyWatcher:
+    """Watches TaskMaster tasks directories with Linux inotify (through ctypes)"""
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                  | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+    # Filesystems where changes made elsewhere produce no inotify events (fuse.* types count too)
+    REMOTE_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ncpfs', 'afs', 'ceph', 'glusterfs',
+                          'lustre', 'gpfs', '9p', 'davfs', 'sshfs'}
+    
+    def __init__(self, libc, fd: int):
+        self.libc = libc
+        self.fd = fd
+        self.projects_by_wd: Dict[int, Path] = {}
+        self.wd_by_dir: Dict[str, int] = {}
+        self.mounts = self.read_mounts()
+    
+    @staticmethod
+    def read_mounts() -> List[Tuple[str, str]]:
+        """(mount point, filesystem type) pairs, longest mount point first"""
+        mounts = []
+        try:
+            with open('/proc/self/mounts', 'r') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 3:
+                        # Spaces and other special characters are octal escapes (\040)
+                        mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[1])
+                        mounts.append((mount_point, fields[2]))
+        except OSError:
+            pass
+        return sorted(mounts, key=lambda mount: len(mount[0]), reverse=True)
+    
+    def is_remote(self, path: str) -> bool:
+        """Whether path lives on a network or FUSE filesystem, where inotify misses changes"""
+        for mount_point, fs_type in self.mounts:
+            if path == mount_point or path.startswith(mount_point.rstrip('/') + '/'):
+                return (fs_type in self.REMOTE_FILESYSTEMS
+                        or (fs_type.startswith('fuse') and fs_type not in ('fuseblk', 'fusectl')))
+        return False
+    
+    @classmethod
+    def create(cls) -> Optional['InotifyWatcher']:
+        """Return a watcher, or None where inotify is not available"""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | cls.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        return cls(libc, fd) if fd >= 0 else None
+    
+    def watch(self, tasks_dir: str, project_path: Path) -> bool:
+        """Watch a project's tasks directory (no-op if already watched)"""
+        if tasks_dir in self.wd_by_dir:
+            return True
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(tasks_dir), self.WATCH_MASK)
+        if wd < 0:
+            return False
+        self.wd_by_dir[tasks_dir] = wd
+        self.projects_by_wd[wd] = project_path
+        return True
+    
+    def wait(self, timeout: float) -> List[Path]:
+        """Wait up to `timeout` seconds; return the projects whose task files changed"""
+        try:
+            readable, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        except InterruptedError:
+            return []
+        if not readable:
+            return []
+        
+        touched = {}
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + self.EVENT_HEADER.size <= len(data):
+                wd, mask, _, name_len = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = data[offset:offset + name_len].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+                offset += name_len
+                if mask & self.IN_Q_OVERFLOW:
+                    # Events were lost: every watched project may have changed
+                    touched.update((str(path), path) for path in self.projects_by_wd.values())
+                    continue
+                project_path = self.projects_by_wd.get(wd)
+                if project_path is None:
+                    continue
+                if mask & self.IN_IGNORED:
+                    # The directory is gone; the next full scan watches it again if it comes back
+                    del self.projects_by_wd[wd]
+                    self.wd_by_dir = {d: w for d, w in self.wd_by_dir.items() if w != wd}
+                    touched[str(project_path)] = project_path
+                elif mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF) or name.endswith('.txt'):
+                    touched[str(project_path)] = project_path
+        return list(touched.values())
+    
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
 class EnhancedTaskMasterSymlinkManager:
-    def __init__(self, obsidian_base_path="/Users/user/____Sandruk/___PKM/_Outputs_AI/taskmaster-s"):
+    CACHE_VERSION = 2
+    FULL_SCAN_INTERVAL = 300  # Seconds between full scans (safety net in inotify mode)
+    DEBOUNCE_SECONDS = 0.25  # Quiet time after the last event before a project is synced
+    MAX_SYNC_DELAY = 1.0  # Sync a busy project at the latest this long after its first event
+    POLL_MIN_INTERVAL = 1.0  # Polling fallback: interval right after a change...
+    POLL_MAX_INTERVAL = 60.0  # ...doubling while idle up to this
+    SLOW_PROJECT_SECONDS = 1.0  # Projects taking longer than this to check are always logged
+    DISCOVERY_MAX_DEPTH = 6  # Directory levels below each root searched for projects
+    DISCOVERY_SKIP_DIRS = {  # Never searched for projects (hidden directories are skipped too)
+        "node_modules", "bower_components", "venv", "__pycache__", "site-packages",
+        "build", "dist", "target", "vendor", "Pods", "DerivedData",
+    }
+
+    def __init__(self, obsidian_base_path="/Users/user/____Sandruk/___PKM/_Outputs_AI/taskmaster-s", workers: int = 8,
+                 discovery_max_depth: int = DISCOVERY_MAX_DEPTH, discovery_skip_dirs: Optional[Set[str]] = None):
         self.obsidian_base_path = Path(obsidian_base_path)
         self.obsidian_base_path.mkdir(parents=True, exist_ok=True)
         
-        # Cache for change detection
+        # Cache for change detection: per tasks directory, its mtime and
+        # [size, mtime_ns, inode, md5] for every task file
         self.cache_file = self.obsidian_base_path / ".symlink_cache.json"
-        self.file_hashes = self.load_cache()
+        self.project_states = self.load_cache()
+        self.pending_states: Dict[str, dict] = {}  # Scanned states of changed projects, stored once synced
+        self.dirty_keys: Set[str] = set()  # Projects whose cache entry changed since the last save
+        self.cache_lock = threading.RLock()
+        
+        # Projects are checked and synced concurrently, each under its own lock
+        self.workers = max(1, workers)
+        self.project_locks: Dict[str, threading.Lock] = {}
+        
+        # Project auto-discovery settings and cache
+        self.discovery_max_depth = discovery_max_depth
+        self.discovery_skip_dirs = self.DISCOVERY_SKIP_DIRS | set(discovery_skip_dirs or ())
+        self.discovery_cache_file = self.obsidian_base_path / ".project_discovery.json"
         
         # Control flags for daemon mode
         self.running = True
@@ -70,23 +221,63 @@ class EnhancedTaskMasterSymlinkManager:
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
     
-    def load_cache(self) -> Dict[str, str]:
-        """Load file hash cache for change detection"""
+    def load_cache(self) -> Dict[str, dict]:
+        """Load task file states cache for change detection"""
         try:
             if self.cache_file.exists():
                 with open(self.cache_file, 'r') as f:
-                    return json.load(f)
+                    data = json.load(f)
+                if data.get('version') == self.CACHE_VERSION:
+                    return data.get('projects', {})
+                # Older caches map file paths to MD5 hashes: keep the hashes, so
+                # the first scan stats and hashes once but reports no changes
+                projects = {}
+                for file_key, file_hash in data.items():
+                    if isinstance(file_hash, str):
+                        file_path = Path(file_key)
+                        state = projects.setdefault(str(file_path.parent), {'mtime_ns': None, 'files': {}})
+                        state['files'][file_path.name] = [None, None, None, file_hash]
+                return projects
         except Exception as e:
             print(f"⚠️  Could not load cache: {e}")
         return {}
     
+    @property
+    def cache_dirty(self) -> bool:
+        return bool(self.dirty_keys)
+    
     def save_cache(self):
-        """Save file hash cache"""
+        """
+        Save task file states cache. Entries this process changed are merged into
+        the file as it is now (another process, e.g. a one-time sync next to the
+        watcher, may have written other projects), and the result replaces it
+        atomically.
+        """
+        with self.cache_lock:
+            try:
+                merged = self.load_cache()
+                for tasks_key, state in self.project_states.items():
+                    if tasks_key in self.dirty_keys or tasks_key not in merged:
+                        merged[tasks_key] = state
+                for tasks_key in self.dirty_keys - set(self.project_states):
+                    merged.pop(tasks_key, None)
+                
+                self.write_json_atomic(self.cache_file, {'version': self.CACHE_VERSION, 'projects': merged})
+                self.project_states = merged
+                self.dirty_keys.clear()
+            except Exception as e:
+                print(f"⚠️  Could not save cache: {e}")
+    
+    def write_json_atomic(self, file_path: Path, data: dict):
+        """Write JSON to a temporary file next to file_path and move it into place"""
+        fd, tmp_path = tempfile.mkstemp(dir=str(file_path.parent), prefix=f"{file_path.name}.", suffix=".tmp")
         try:
-            with open(self.cache_file, 'w') as f:
-                json.dump(self.file_hashes, f, indent=2)
-        except Exception as e:
-            print(f"⚠️  Could not save cache: {e}")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
     
     def get_file_hash(self, file_path: Path) -> str:
         """Calculate file hash for change detection"""
@@ -157,26 +348,87 @@ class EnhancedTaskMasterSymlinkManager:
         
         return list(taskmaster_tasks_path.glob("*.txt"))
     
+    def get_tasks_key(self, project_path: Path) -> str:
+        """Cache key of a project: its resolved .taskmaster/tasks directory"""
+        return str(Path(project_path).resolve() / ".taskmaster" / "tasks")
+    
+    def scan_project_state(self, project_path: Path) -> Tuple[bool, Optional[dict]]:
+        """
+        Compare a project's task files with the cache by (size, mtime_ns, inode).
+        Only files whose stat changed are hashed. An unchanged directory mtime means
+        no file was added, removed or renamed, so the listing is skipped; files are
+        still stat-ed because in-place writes do not touch the directory mtime.
+        Returns (changed, new state), with no state if there is no tasks directory.
+        """
+        tasks_key = self.get_tasks_key(project_path)
+        cached = self.project_states.get(tasks_key) or {'mtime_ns': None, 'files': {}}
+        cached_files = cached['files']
+        try:
+            dir_mtime = os.stat(tasks_key).st_mtime_ns
+        except OSError:
+            return False, None
+        
+        if dir_mtime == cached['mtime_ns']:
+            names = list(cached_files)
+        else:
+            try:
+                with os.scandir(tasks_key) as entries:
+                    names = [entry.name for entry in entries if entry.name.endswith('.txt') and entry.is_file()]
+            except OSError:
+                return False, None
+        
+        changed = set(names) != set(cached_files)
+        files = {}
+        for name in names:
+            file_path = os.path.join(tasks_key, name)
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                changed = True
+                continue
+            signature = [st.st_size, st.st_mtime_ns, st.st_ino]
+            cached_state = cached_files.get(name)
+            if cached_state is not None and cached_state[:3] == signature:
+                files[name] = cached_state
+                continue
+            file_hash = self.get_file_hash(Path(file_path))
+            files[name] = signature + [file_hash]
+            if cached_state is None or cached_state[3] != file_hash:
+                changed = True
+        
+        return changed, {'mtime_ns': dir_mtime, 'files': files}
+    
     def has_project_changed(self, project_path: Path) -> bool:
         """Check if any task files in project have changed"""
-        task_files = self.get_task_files(project_path)
-        
-        for task_file in task_files:
-            file_key = str(task_file)
-            current_hash = self.get_file_hash(task_file)
-            
-            if file_key not in self.file_hashes or self.file_hashes[file_key] != current_hash:
-                return True
+        changed, state = self.scan_project_state(project_path)
+        if state is None:
+            return False
         
-        return False
+        tasks_key = self.get_tasks_key(project_path)
+        with self.cache_lock:
+            if changed:
+                # Kept until the project is synced, so its files are not hashed again
+                self.pending_states[tasks_key] = state
+            elif state != self.project_states.get(tasks_key):
+                # Only stats changed (touch, copy over identical content)
+                self.project_states[tasks_key] = state
+                self.dirty_keys.add(tasks_key)
+        return changed
     
     def update_project_hashes(self, project_path: Path):
-        """Update cached hashes for project files"""
-        task_files = self.get_task_files(project_path)
+        """Update cached states for project files"""
+        tasks_key = self.get_tasks_key(project_path)
+        with self.cache_lock:
+            state = self.pending_states.pop(tasks_key, None)
+        if state is None:
+            state = self.scan_project_state(project_path)[1]
         
-        for task_file in task_files:
-            file_key = str(task_file)
-            self.file_hashes[file_key] = self.get_file_hash(task_file)
+        with self.cache_lock:
+            if state is None:
+                self.project_states.pop(tasks_key, None)
+            else:
+                self.project_states[tasks_key] = state
+            self.dirty_keys.add(tasks_key)
     
     def process_project(self, project_path: Path, force: bool = False) -> bool:
         """Process a single project"""
@@ -194,41 +446,106 @@ class EnhancedTaskMasterSymlinkManager:
         
         project_name = self.get_project_name(project_path)
         task_files = self.get_task_files(project_path)
-        
-        if not task_files:
-            return True  # No tasks, but not an error
-        
-        # Create project directory
         project_dir = self.obsidian_base_path / project_name
-        project_dir.mkdir(parents=True, exist_ok=True)
         
-        # Remove existing symlinks for this project to handle renames/deletions
-        for existing_symlink in project_dir.glob("*.md"):
-            if existing_symlink.is_symlink():
-                existing_symlink.unlink()
+        if not task_files and not (project_dir.is_dir() and (project_path / ".taskmaster" / "tasks").is_dir()):
+            self.update_project_hashes(project_path)
+            return True  # No tasks, but not an error
         
-        # Create new symlinks
-        success_count = 0
+        # Desired symlinks from the parsed tasks
+        desired: Dict[str, str] = {}
+        duplicates = 0
         for task_file in task_files:
             task_info = self.parse_task_info(task_file)
             if not task_info:
                 continue
             
             symlink_name = self.create_informative_symlink_name(task_info, project_name)
-            target_file = project_dir / symlink_name
-            
-            try:
-                target_file.symlink_to(task_file.resolve())
-                print(f"✅ {task_file.name} -> {symlink_name}")
-                success_count += 1
-            except Exception as e:
-                print(f"❌ Failed to create symlink for {task_file.name}: {e}")
+            if symlink_name in desired:
+                print(f"❌ Failed to create symlink for {task_file.name}: {symlink_name} is already used by another task")
+                duplicates += 1
+                continue
+            desired[symlink_name] = str(task_file.resolve())
+        
+        # Create project directory
+        project_dir.mkdir(parents=True, exist_ok=True)
+        
+        counts = self.reconcile_symlinks(project_dir, desired)
+        counts['failed'] += duplicates
         
         # Update cache
         self.update_project_hashes(project_path)
         
-        print(f"📊 {project_name}: {success_count}/{len(task_files)} symlinks created")
-        return success_count > 0
+        print(f"📊 {project_name}: {counts['unchanged']} unchanged, {counts['created']} created, "
+              f"{counts['renamed']} renamed, {counts['removed']} removed"
+              + (f", {counts['failed']} failed" if counts['failed'] else ""))
+        # A project whose tasks were all removed syncs to an empty folder; only errors count as failure
+        return counts['failed'] == 0
+    
+    def reconcile_symlinks(self, project_dir: Path, desired: Dict[str, str]) -> Dict[str, int]:
+        """
+        Bring the *.md symlinks in project_dir in line with desired {name: target}.
+        Links already correct are left alone, a task whose name changed (e.g. its
+        status) is renamed, so Obsidian sees one rename instead of a delete and a
+        create, and only links without a task are removed.
+        """
+        counts = {'unchanged': 0, 'created': 0, 'renamed': 0, 'removed': 0, 'failed': 0}
+        
+        current: Dict[str, str] = {}
+        with os.scandir(project_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.md') and entry.is_symlink():
+                    try:
+                        current[entry.name] = os.readlink(entry.path)
+                    except OSError:
+                        continue
+        
+        stale = {name: target for name, target in current.items() if desired.get(name) != target}
+        stale_by_target = {target: name for name, target in stale.items()}
+        for name, target in desired.items():
+            if current.get(name) == target:
+                counts['unchanged'] += 1
+                continue
+            
+            link_path = project_dir / name
+            if name not in current and os.path.lexists(link_path):
+                print(f"❌ Failed to create symlink {name}: a file with that name already exists")
+                counts['failed'] += 1
+                continue
+            old_name = stale_by_target.pop(target, None)
+            try:
+                if old_name is not None:
+                    os.replace(project_dir / old_name, link_path)
+                    del stale[old_name]
+                    print(f"🔁 {old_name} -> {name}")
+                    counts['renamed'] += 1
+                else:
+                    # Build the link aside and move it into place, replacing a stale one atomically
+                    tmp_path = project_dir / f".{name}.tmp"
+                    if os.path.lexists(tmp_path):
+                        os.unlink(tmp_path)
+                    os.symlink(target, tmp_path)
+                    os.replace(tmp_path, link_path)
+                    print(f"✅ {Path(target).name} -> {name}")
+                    counts['created'] += 1
+            except OSError as e:
+                print(f"❌ Failed to create symlink {name}: {e}")
+                counts['failed'] += 1
+                continue
+            if name in stale:
+                # The stale link that had this name was just replaced
+                stale_by_target.pop(stale.pop(name), None)
+        
+        for name in stale:
+            try:
+                os.unlink(project_dir / name)
+                print(f"🗑️  Removed {name}")
+                counts['removed'] += 1
+            except OSError as e:
+                print(f"❌ Failed to remove symlink {name}: {e}")
+                counts['failed'] += 1
+        
+        return counts
     
     def load_projects_list(self, projects_file: Optional[Path] = None) -> List[Path]:
         """Load list of projects to monitor"""
@@ -246,8 +563,8 @@ class EnhancedTaskMasterSymlinkManager:
         
         return projects
     
-    def auto_discover_projects(self) -> List[Path]:
-        """Auto-discover TaskMaster projects"""
+    def get_discovery_roots(self) -> List[str]:
+        """Resolved, de-duplicated roots searched for TaskMaster projects"""
         common_roots = [
             Path.home() / "__Repositories",
             Path.home() / "Repositories", 
@@ -255,18 +572,202 @@ class EnhancedTaskMasterSymlinkManager:
             Path("/Users/user/__Repositories")
         ]
         
-        projects = []
+        roots = []
         for root in common_roots:
-            if root.exists():
-                for item in root.rglob(".taskmaster"):
-                    if item.is_dir() and (item / "tasks").exists():
-                        projects.append(item.parent)
+            root = os.path.realpath(root)
+            if root not in roots:
+                roots.append(root)
+        return roots
+    
+    def walk_for_projects(self, path: str, level: int, dirs: Dict[str, list], projects: Set[str]):
+        """
+        Walk path (at depth level below its root) for directories containing
+        .taskmaster/tasks. Hidden and heavy directories are pruned, symlinked
+        directories are not followed, and nothing deeper than the maximum depth is
+        listed. Every listed directory is recorded in dirs as [mtime_ns, level];
+        each .taskmaster directory as [mtime_ns, -1], so a tasks directory appearing
+        in it is noticed on revalidation.
+        """
+        stack = [(path, level)]
+        while stack:
+            path, level = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            dirs[path] = [mtime, level]
+            
+            for entry in entries:
+                try:
+                    if entry.name == ".taskmaster":
+                        if entry.is_dir():
+                            dirs[entry.path] = [entry.stat().st_mtime_ns, -1]
+                            if os.path.isdir(os.path.join(entry.path, "tasks")):
+                                projects.add(path)
+                        continue
+                    if (level >= self.discovery_max_depth or entry.name.startswith('.')
+                            or entry.name in self.discovery_skip_dirs):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, level + 1))
+                except OSError:
+                    continue
+    
+    def auto_discover_projects(self) -> List[Path]:
+        """
+        Auto-discover TaskMaster projects. The directories listed by the last
+        discovery are kept with their mtimes in .project_discovery.json; later
+        runs stat them and only re-walk the subtrees of directories that changed.
+        """
+        start_time = time.perf_counter()
+        roots = self.get_discovery_roots()
+        config = {'roots': roots, 'max_depth': self.discovery_max_depth,
+                  'skip_dirs': sorted(self.discovery_skip_dirs)}
+        
+        cache = {}
+        try:
+            with open(self.discovery_cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            pass
+        
+        if cache.get('version') == self.CACHE_VERSION and cache.get('config') == config:
+            dirs: Dict[str, list] = cache['dirs']
+            projects = set(cache['projects'])
+            
+            changed = []
+            for path, (mtime, level) in dirs.items():
+                try:
+                    if os.stat(path).st_mtime_ns == mtime:
+                        continue
+                except OSError:
+                    pass
+                changed.append(path)
+            # Roots that did not exist at the last discovery
+            changed.extend(root for root in roots if root not in dirs and os.path.isdir(root))
+            
+            rescanned: List[str] = []
+            for path in sorted(changed, key=len):
+                level = dirs[path][1] if path in dirs else 0
+                if level == -1:
+                    # A .taskmaster directory changed: re-walk its project directory
+                    path = os.path.dirname(path)
+                    level = dirs[path][1] if path in dirs else 0
+                if any(path == done or path.startswith(done + os.sep) for done in rescanned):
+                    continue
+                prefix = path + os.sep
+                for stale in [d for d in dirs if d == path or d.startswith(prefix)]:
+                    del dirs[stale]
+                projects = {p for p in projects if p != path and not p.startswith(prefix)}
+                self.walk_for_projects(path, level, dirs, projects)
+                rescanned.append(path)
+            
+            summary = f"revalidated {len(dirs)} directories, re-walked {len(rescanned)}"
+            dirty = bool(rescanned)
+        else:
+            dirs, projects = {}, set()
+            for root in roots:
+                self.walk_for_projects(root, 0, dirs, projects)
+            summary = f"walked {len(dirs)} directories"
+            dirty = True
+        
+        if dirty:
+            try:
+                self.write_json_atomic(self.discovery_cache_file, {
+                    'version': self.CACHE_VERSION, 'config': config,
+                    'projects': sorted(projects), 'dirs': dirs})
+            except OSError as e:
+                print(f"⚠️  Could not save discovery cache: {e}")
+        
+        print(f"🔎 Discovery: {summary} in {time.perf_counter() - start_time:.2f}s")
+        return [Path(project) for project in sorted(projects)]
+    
+    def get_project_lock(self, project_path: Path) -> threading.Lock:
+        """
+        Lock serializing syncs of one project. Keyed by the Obsidian project
+        directory, so projects sharing a name never reconcile it at the same time.
+        """
+        project_name = self.get_project_name(Path(project_path).resolve())
+        with self.cache_lock:
+            return self.project_locks.setdefault(project_name, threading.Lock())
+    
+    def sync_project(self, project_path: Path) -> bool:
+        """Sync a project if its task files changed; returns whether it did"""
+        start_time = time.perf_counter()
+        changed = False
+        with self.get_project_lock(project_path):
+            try:
+                if self.has_project_changed(project_path):
+                    print(f"📝 Changes detected in {project_path.name}")
+                    self.process_project(project_path, force=True)
+                    changed = True
+            except Exception as e:
+                print(f"❌ Error processing {project_path}: {e}")
         
-        return list(set(projects))  # Remove duplicates
+        elapsed = time.perf_counter() - start_time
+        if changed or elapsed >= self.SLOW_PROJECT_SECONDS:
+            slow = " 🐢 slow" if elapsed >= self.SLOW_PROJECT_SECONDS else ""
+            print(f"⏱️  {project_path.name}: {elapsed:.2f}s{slow}")
+        return changed
+    
+    def scan_projects(self, projects: List[Path]) -> bool:
+        """Check every project and sync the changed ones (concurrently); returns whether any changed"""
+        workers = min(self.workers, len(projects))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(self.sync_project, projects))
+        else:
+            results = [self.sync_project(project_path) for project_path in projects]
+        
+        if self.cache_dirty:
+            self.save_cache()
+        return any(results)
+    
+    def watch_projects(self, watcher: InotifyWatcher, projects: List[Path],
+                       polled: Dict[str, Path]) -> Dict[str, Path]:
+        """
+        Add inotify watches where possible. Returns the projects that have to be
+        polled instead: tasks directories that do not exist (yet), live on a
+        network or FUSE filesystem, or could not be watched (e.g. the
+        max_user_watches limit). polled is the previous result, so each project
+        is only reported once.
+        """
+        unwatched = {}
+        for project_path in projects:
+            tasks_key = self.get_tasks_key(project_path)
+            if tasks_key in watcher.wd_by_dir:
+                continue
+            reason = None
+            if not os.path.isdir(tasks_key):
+                pass  # Polled until the tasks directory appears
+            elif watcher.is_remote(tasks_key):
+                reason = "network or FUSE filesystem"
+            elif not watcher.watch(tasks_key, project_path):
+                reason = "could not add an inotify watch"
+            else:
+                continue
+            if reason and tasks_key not in polled:
+                print(f"⚠️  Polling {project_path.name} instead of watching it: {reason}")
+            unwatched[tasks_key] = project_path
+        return unwatched
     
-    def watch_mode(self, projects_file: Optional[Path] = None):
-        """Continuous monitoring mode with 5-minute intervals"""
-        print("🔄 Starting TaskMaster symlinks watcher (5-minute intervals)")
+    def watch_mode(self, projects_file: Optional[Path] = None, poll: bool = False):
+        """
+        Continuous monitoring mode. On Linux, inotify on every project's tasks
+        directory re-syncs a changed project within a second (bursts of writes are
+        debounced), with a full scan every 5 minutes as a safety net. Projects
+        that cannot be watched (no inotify, poll=True, network or FUSE mounts,
+        watch limits) are polled: every second after a change, backing off to
+        once a minute while idle.
+        """
+        watcher = None if poll else InotifyWatcher.create()
+        if watcher:
+            print("🔄 Starting TaskMaster symlinks watcher (inotify, full scan every 5 minutes)")
+        else:
+            print(f"🔄 Starting TaskMaster symlinks watcher (polling every "
+                  f"{self.POLL_MIN_INTERVAL:.0f}-{self.POLL_MAX_INTERVAL:.0f}s)")
         print("Press Ctrl+C to stop")
         
         # Load projects list
@@ -279,35 +780,81 @@ class EnhancedTaskMasterSymlinkManager:
         
         if not projects:
             print("❌ No projects found to monitor")
+            if watcher:
+                watcher.close()
             return
         
         iteration = 0
-        while self.running:
-            iteration += 1
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            print(f"\n⏰ [{timestamp}] Scan #{iteration}")
-            
-            changes_detected = False
-            for project_path in projects:
-                try:
-                    if self.has_project_changed(project_path):
-                        print(f"📝 Changes detected in {project_path.name}")
-                        self.process_project(project_path)
-                        changes_detected = True
-                except Exception as e:
-                    print(f"❌ Error processing {project_path}: {e}")
-            
-            if changes_detected:
-                self.save_cache()
-                print("💾 Cache updated")
-            else:
-                print("✨ No changes detected")
-            
-            # Wait for 5 minutes (300 seconds)
-            for i in range(300):
-                if not self.running:
-                    break
-                time.sleep(1)
+        next_scan = 0.0
+        polled: Dict[str, Path] = {}  # {tasks directory: project} checked by polling
+        poll_interval = self.POLL_MIN_INTERVAL
+        next_poll = float('inf')
+        pending: Dict[str, List] = {}  # {project: [path, first event, last event]}
+        try:
+            while self.running:
+                now = time.monotonic()
+                if now >= next_scan:
+                    # Full scan: always at start, then every 5 minutes while watching
+                    iteration += 1
+                    timestamp = datetime.now().strftime("%H:%M:%S")
+                    print(f"\n⏰ [{timestamp}] Scan #{iteration}")
+                    if self.scan_projects(projects):
+                        print("💾 Cache updated")
+                    else:
+                        print("✨ No changes detected")
+                    
+                    if watcher:
+                        polled = self.watch_projects(watcher, projects, polled)
+                        if iteration == 1:
+                            print(f"👀 Watching {len(watcher.wd_by_dir)} task directories, polling {len(polled)}")
+                        next_scan = time.monotonic() + self.FULL_SCAN_INTERVAL
+                    else:
+                        polled = {str(project_path): project_path for project_path in projects}
+                        next_scan = float('inf')
+                    poll_interval = self.POLL_MIN_INTERVAL
+                    next_poll = time.monotonic() + poll_interval
+                    continue
+                
+                if polled and now >= next_poll:
+                    changes_detected = self.scan_projects(list(polled.values()))
+                    if changes_detected:
+                        print("💾 Cache updated")
+                    poll_interval = (self.POLL_MIN_INTERVAL if changes_detected
+                                     else min(poll_interval * 2, self.POLL_MAX_INTERVAL))
+                    next_poll = time.monotonic() + poll_interval
+                    if watcher:
+                        # A tasks directory that appeared can be watched from now on
+                        polled = self.watch_projects(watcher, projects, polled)
+                    continue
+                
+                deadline = min(next_scan, next_poll if polled else float('inf'))
+                if not watcher:
+                    time.sleep(max(0.0, min(1.0, deadline - now)))
+                    continue
+                
+                # Sleep until the next event, debounce deadline, poll or full scan (at most 1s for Ctrl+C)
+                timeout = min(1.0, deadline - now)
+                for _, first_event, last_event in pending.values():
+                    timeout = min(timeout, last_event + self.DEBOUNCE_SECONDS - now,
+                                  first_event + self.MAX_SYNC_DELAY - now)
+                for project_path in watcher.wait(timeout):
+                    now = time.monotonic()
+                    entry = pending.setdefault(str(project_path), [project_path, now, now])
+                    entry[2] = now
+                
+                now = time.monotonic()
+                ready = [key for key, (_, first_event, last_event) in pending.items()
+                         if now - last_event >= self.DEBOUNCE_SECONDS or now - first_event >= self.MAX_SYNC_DELAY]
+                if ready:
+                    timestamp = datetime.now().strftime("%H:%M:%S")
+                    print(f"\n⚡ [{timestamp}] Task files changed in {len(ready)} project(s)")
+                    if self.scan_projects([pending.pop(key)[0] for key in ready]):
+                        print("💾 Cache updated")
+                    # A tasks directory that was recreated needs a new watch (or polling)
+                    polled = self.watch_projects(watcher, projects, polled)
+        finally:
+            if watcher:
+                watcher.close()
         
         print("\n🛑 Watcher stopped")
     
@@ -355,9 +902,10 @@ Examples:
   # One-time sync
   python taskmaster_symlinks_enhanced.py /path/to/project
   
-  # Watch mode (5-minute intervals)
+  # Watch mode (inotify on Linux, adaptive polling elsewhere)
   python taskmaster_symlinks_enhanced.py --watch
   python taskmaster_symlinks_enhanced.py --watch ~/projects.txt
+  python taskmaster_symlinks_enhanced.py --watch ~/projects.txt --poll
   
   # Install as macOS daemon
   python taskmaster_symlinks_enhanced.py --install-daemon
@@ -399,6 +947,35 @@ Examples:
         help="Stop the daemon"
     )
     
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="With --watch, poll for changes instead of using inotify"
+    )
+    
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=8,
+        help="Number of projects checked and synced concurrently in watch mode (default: 8)"
+    )
+    
+    parser.add_argument(
+        "--discover-depth",
+        type=int,
+        default=EnhancedTaskMasterSymlinkManager.DISCOVERY_MAX_DEPTH,
+        help="Directory levels below each root searched when auto-discovering projects "
+             f"(default: {EnhancedTaskMasterSymlinkManager.DISCOVERY_MAX_DEPTH})"
+    )
+    
+    parser.add_argument(
+        "--discover-skip",
+        action="append",
+        default=[],
+        metavar="NAME",
+        help="Additional directory name never searched when auto-discovering projects (repeatable)"
+    )
+    
     parser.add_argument(
         "--force",
         action="store_true",
@@ -407,7 +984,8 @@ Examples:
     
     args = parser.parse_args()
     
-    manager = EnhancedTaskMasterSymlinkManager()
+    manager = EnhancedTaskMasterSymlinkManager(workers=args.jobs, discovery_max_depth=args.discover_depth,
+                                               discovery_skip_dirs=set(args.discover_skip))
     
     if args.install_daemon:
         projects_file = Path(args.watch) if isinstance(args.watch, str) else None
@@ -431,7 +1009,7 @@ Examples:
             
     elif args.watch:
         projects_file = Path(args.watch) if isinstance(args.watch, str) else None
-        manager.watch_mode(projects_file)
+        manager.watch_mode(projects_file, poll=args.poll)
         
     elif args.project_path:
         success = manager.process_project(Path(args.project_path), args.force)